@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Insert/remove/lookup cost of FolderModel on large listings.
+# Usage: python3 benchmarks/bench_foldermodel.py [names ...] [--events N]
+# Default sizes: 10k, 100k and 1M names.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.foldermodel import FolderModel  # noqa: E402
+from src.sorting import getNaturalKey  # noqa: E402
+
+
+def timeit(label, run):
+    start = time.perf_counter()
+    run()
+    print('%-40s %9.1f ms' % (label, (time.perf_counter() - start) * 1000))
+
+
+SIZES = (10000, 100000, 1000000)
+EVENTS = 500  # Creates and deletes of a burst
+
+
+def main():
+    args = sys.argv[1:]
+    events = EVENTS
+    if '--events' in args:
+        position = args.index('--events')
+        events = int(args[position + 1])
+        del args[position:position + 2]
+    for count in [int(arg) for arg in args] or SIZES:
+        run(count, events)
+        print()
+
+
+def run(count, events):
+    random.seed(0)
+    names = ['IMG_%07d.jpg' % i for i in range(count)]
+    added = ['IMG_%07d_copy.jpg' % i for i in random.sample(range(count), events)]
+    removed = random.sample(names, events)
+    probes = random.sample(names, 10000)
+    print('%d names, %d events' % (count, events))
+
+    model = FolderModel(names)
+    getNaturalKey.cache_clear()
+    timeit('sort listing (cold key cache)', lambda: FolderModel(names))
+    timeit('first lookup (builds the map)', lambda: model.getPosition(names[0]))
+    timeit('10000 lookups', lambda: [model.getPosition(name) for name in probes])
+
+    for shuffled in (False, True):
+        mode = 'shuffled' if shuffled else 'sorted'
+        model = FolderModel(names, is_sorted=True)
+        if shuffled:
+            timeit('shuffle', lambda: model.shuffle(names[0]))
+        current = names[0]
+        # The viewer has looked up the current image already
+        model.getPosition(current)
+
+        def singles():
+            # One event at a time, each followed by the lookup of the current image
+            for name in added:
+                model.insert(name)
+                model.getPosition(current)
+            for name in removed:
+                model.remove(name)
+                model.getPosition(current)
+
+        timeit('%s: %d single inserts/removes' % (mode, 2 * events), singles)
+        model = FolderModel(names, is_sorted=True)
+        if shuffled:
+            model.shuffle(current)
+        model.getPosition(current)
+
+        def batch():
+            model.update(added, removed)
+            model.getPosition(current)
+
+        timeit('%s: one batch of %d' % (mode, 2 * events), batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# ms/frame to read the frames of GIFs, before and after dropping our
+# own composition layer (user-015):
+# - Pillow decode: seek and load only
+# - before: the frame rectangle composed again on our own canvas
+# - after: Pillow's composed frame converted to RGBA (src.animationfile)
+# Usage: python3 benchmarks/bench_gif_frames.py [file.gif | folder ...]
+# Without arguments, 1024x768 GIFs of 60 small moving frames are generated.
+
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+from PIL import ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.animationfile import iterFrames  # noqa: E402
+
+SIZE = (1024, 768)
+FRAMES = 60
+
+DISPOSE_NONE = 1
+DISPOSE_BACKGROUND = 2
+DISPOSE_PREVIOUS = 3
+
+
+def makeGIF(path, disposal):
+    frames = []
+    background = Image.radial_gradient('L').resize(SIZE).convert('P')
+    for index in range(FRAMES):
+        frame = background.copy()
+        x = 10 * index
+        ImageDraw.Draw(frame).ellipse((x, 100, x + 120, 220), fill=index % 200)
+        frames.append(frame)
+    # The writer only stores the rectangle which changed
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40, loop=0, disposal=disposal)
+
+
+def composeRectangle(img, prev):
+    # The removed layer: compose the frame rectangle on prev (in place)
+    if prev is None:
+        canvas = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    else:
+        canvas = prev
+        box, disposal, saved = canvas.info.pop('dispose')
+        if disposal == DISPOSE_BACKGROUND:
+            canvas.paste((0, 0, 0, 0), box)
+        elif disposal == DISPOSE_PREVIOUS and saved is not None:
+            canvas.paste(saved, box[:2])
+    box = getattr(img, 'dispose_extent', None) or (0, 0) + img.size
+    disposal = getattr(img, 'disposal_method', DISPOSE_NONE)
+    saved = canvas.crop(box) if disposal == DISPOSE_PREVIOUS else None
+    canvas.alpha_composite(img.crop(box).convert('RGBA'), dest=box[:2])
+    canvas.info['dispose'] = (box, disposal, saved)
+    return canvas
+
+
+def decodeOnly(path):
+    with Image.open(path) as img:
+        for index in range(img.n_frames):
+            img.seek(index)
+            img.load()
+        return img.n_frames
+
+
+def readBefore(path):
+    with Image.open(path) as img:
+        prev = None
+        for index in range(img.n_frames):
+            img.seek(index)
+            prev = composeRectangle(img, prev)
+        return img.n_frames
+
+
+def readAfter(path):
+    with Image.open(path) as img:
+        return sum(1 for _ in iterFrames(img))
+
+
+def timeit(run, repeat=3):
+    # Best ms/frame
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = run()
+        elapsed = (time.perf_counter() - start) * 1000 / max(count, 1)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def getPaths(args):
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths += sorted(os.path.join(arg, name) for name in os.listdir(arg) if name.lower().endswith('.gif'))
+        else:
+            paths.append(arg)
+    if len(paths) == 0 and len(args) == 0:
+        folder = tempfile.mkdtemp()
+        for disposal in (DISPOSE_NONE, DISPOSE_BACKGROUND, DISPOSE_PREVIOUS):
+            path = os.path.join(folder, 'disposal%d.gif' % disposal)
+            makeGIF(path, disposal)
+            paths.append(path)
+    return paths
+
+
+def main():
+    print('%-32s %7s %10s %8s %8s' % ('ms/frame', 'frames', 'decode', 'before', 'after'))
+    totals = [0, 0.0, 0.0, 0.0]
+    for path in getPaths(sys.argv[1:]):
+        try:
+            with Image.open(path) as img:
+                frames = getattr(img, 'n_frames', 1)
+            times = [timeit(lambda: decodeOnly(path)), timeit(lambda: readBefore(path)),
+                     timeit(lambda: readAfter(path))]
+        except Exception as error:
+            print('%-32s %s' % (os.path.basename(path)[:32], error))
+            continue
+        print('%-32s %7d %10.2f %8.2f %8.2f' % ((os.path.basename(path)[:32], frames) + tuple(times)))
+        totals[0] += frames
+        for index, value in enumerate(times):
+            totals[index + 1] += value * frames
+    if totals[0] > 0:
+        print('%-32s %7d %10.2f %8.2f %8.2f' % (('all', totals[0]) + tuple(value / totals[0] for value in totals[1:])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Banded parallel scaling against a single scale_simple call.
+# Usage: python3 benchmarks/bench_parallelscale.py [width] [height]
+# Needs PyGObject (GdkPixbuf).
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import gi
+    gi.require_version('GdkPixbuf', '2.0')
+    from gi.repository import GdkPixbuf
+    from gi.repository import GLib
+    from src.parallelscale import scaleParallel
+except (ImportError, ValueError):
+    sys.exit('PyGObject is required')
+
+OUTPUTS = [(1920, 1080), (3840, 2160), (12000, 8000)]
+INTERPOLATIONS = [('nearest', GdkPixbuf.InterpType.NEAREST), ('bilinear', GdkPixbuf.InterpType.BILINEAR),
+                  ('hyper', GdkPixbuf.InterpType.HYPER)]
+
+
+def timeit(run, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    data = os.urandom(width * height * 3)
+    source = GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(data), GdkPixbuf.Colorspace.RGB,
+                                             False, 8, width, height, width * 3)
+    print('%dx%d source, %d CPUs' % (width, height, os.cpu_count() or 1))
+    for name, interp in INTERPOLATIONS:
+        for output in OUTPUTS:
+            single = timeit(lambda: source.scale_simple(*output, interp))
+            parallel = timeit(lambda: scaleParallel(source, *output, interp))
+            print('%-8s -> %5dx%-5d scale_simple %8.1f ms  scaleParallel %8.1f ms  x%.2f'
+                  % (name, output[0], output[1], single, parallel, single / parallel))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Cost of each step of the PIL image -> GdkPixbuf conversion, per mode:
+# time per megapixel and bytes copied.
+# Usage: python3 benchmarks/bench_pixbufconvert.py [width] [height]
+# Needs PyGObject (GdkPixbuf).
+
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from gi.repository import GLib
+    from src.pixbufconvert import DEEP_MODES
+    from src.pixbufconvert import FLOAT_MODE
+    from src.pixbufconvert import convertPilImageToGdkPixbuf
+    from src.pixbufconvert import normalizeMode
+except ImportError:
+    sys.exit('PyGObject is required')
+
+MODES = ['RGB', 'RGBA', 'L', 'LA', '1', 'P', 'P+transparency', 'CMYK', 'I;16', 'I', 'F']
+
+
+def makeImage(mode, width, height):
+    gradient = Image.linear_gradient('L').resize((width, height))
+    if mode == 'P+transparency':
+        image = gradient.convert('RGB').convert('P')
+        image.info['transparency'] = 0
+        return image
+    if mode in ('I;16', 'I'):
+        return gradient.convert('I').point(lambda x: x * 257).convert(mode)
+    if mode == 'F':
+        # The usual 0..1 float image
+        return gradient.convert('F').point(lambda x: x / 255)
+    return gradient.convert(mode)
+
+
+def getCopiedBytes(image, normalized):
+    # Bytes written by each copy of the pixels
+    size = len(normalized.getbands()) * normalized.width * normalized.height
+    copies = []
+    if normalized is not image:
+        if image.mode in DEEP_MODES or image.mode == FLOAT_MODE:
+            # point() output, then the RGB conversion
+            copies.append(('point', len(image.getbands()) * image.width * image.height * 4))
+        copies.append(('convert', size))
+    copies += [('tobytes chunks', size), ('tobytes join', size), ('GLib.Bytes', size)]
+    return copies
+
+
+def timeit(run, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    megapixels = width * height / 1e6
+    print('%dx%d (%.1f MP), ms/MP' % (width, height, megapixels))
+    print('%-16s %10s %10s %10s %10s %12s' % ('mode', 'normalize', 'tobytes', 'GLib.Bytes', 'total', 'MB copied'))
+    for mode in MODES:
+        image = makeImage(mode, width, height)
+        normalized = normalizeMode(image)
+        data = normalized.tobytes()
+        copied = sum(size for _, size in getCopiedBytes(image, normalized))
+        print('%-16s %10.2f %10.2f %10.2f %10.2f %12.1f' % (
+            mode,
+            timeit(lambda: normalizeMode(image)) / megapixels,
+            timeit(lambda: normalized.tobytes()) / megapixels,
+            timeit(lambda: GLib.Bytes.new(data)) / megapixels,
+            timeit(lambda: convertPilImageToGdkPixbuf(image)) / megapixels,
+            copied / 2 ** 20))
+    print()
+    print('Copies: point (deep modes), convert (modes other than RGB/RGBA),'
+          ' tobytes chunks, tobytes join, GLib.Bytes')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# Natural sort of a large synthetic listing.
+# Usage: python3 benchmarks/bench_sorting.py [names]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import sorting  # noqa: E402
+from src.foldermodel import FolderModel  # noqa: E402
+from src.sorting import getNaturalKey  # noqa: E402
+
+PATTERNS = ['IMG_%d.JPG', 'img_%d.jpg', 'Photo (%d).png', 'scan-%d-final.webp', '%d.gif']
+
+
+def timeit(label, run):
+    start = time.perf_counter()
+    run()
+    print('%-44s %9.1f ms' % (label, (time.perf_counter() - start) * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    random.seed(0)
+    names = [random.choice(PATTERNS) % number for number in range(count)]
+    random.shuffle(names)
+    print('%d names, natural key: %s, key cache: %d names'
+          % (count, sorting.NATURAL_KEY_VERSION, sorting.NATURAL_KEY_CACHE))
+
+    timeit('sorted() on plain strings', lambda: sorted(names))
+    getNaturalKey.cache_clear()
+    timeit('natural sort, cold key cache', lambda: sorted(names, key=getNaturalKey))
+    timeit('natural sort, again', lambda: sorted(names, key=getNaturalKey))
+    subset = names[:sorting.NATURAL_KEY_CACHE // 2]
+    sorted(subset, key=getNaturalKey)
+    timeit('natural sort of %d cached names' % len(subset), lambda: sorted(subset, key=getNaturalKey))
+    getNaturalKey.cache_clear()
+    timeit('FolderModel(names)', lambda: FolderModel(names))
+    keys = {name: getNaturalKey(name) for name in names}
+    timeit('FolderModel(names) with the keys computed', lambda: FolderModel(names, keys=keys))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ def run():
     parser.add_argument("address", nargs="*", help="Image address")
     parser.add_argument("--shuffle", action="store_true", help="Shuffle")
     parser.add_argument("--slideshow", action="store_true", help="Slideshow")
+    parser.add_argument("--recursive", action="store_true", help="Navigate the images in all the subfolders")
 
     args = parser.parse_args()
 
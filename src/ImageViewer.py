@@ -1,19 +1,14 @@
 #!/usr/bin/env python3
 
+import bisect
+import itertools
 import os
-import random
+import sys
+import threading
 
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 
-# Import natsort if available
-try:
-    from natsort import natsorted
-except ImportError:
-    def natsorted(data):
-        it = list(data)
-        it.sort()
-        return it
-
 # Import pyinotify if possible
 try:
     import pyinotify
@@ -21,6 +16,9 @@ try:
 except ImportError:
     INOTIFY = False
 
+# Print statistics on stderr (zoom render times, image cache) if IW_DEBUG_STATS is set
+DEBUG_STATS = bool(os.environ.get('IW_DEBUG_STATS'))
+
 from src.Interface import Interface
 
 from gi.repository import GLib
@@ -28,21 +26,56 @@ from gi.repository import GdkPixbuf
 from gi.repository import Gtk
 
 from .configuration import readConfig
+from .imagecache import ImageCache
+from .imagecache import getRenditionKey
+from .pixbufconvert import convertPilImageToGdkPixbuf
+from .pixbufconvert import normalizeMode
+from .parallelscale import scaleParallel
+from .animation import AnimationFrameStore
+from .animation import PixbufAnimationPlayer
+from .animation import StreamingFrames
+from .animationfile import isAnimatedFile
+from .animationfile import iterFrames
+from .prefetch import ImagePrefetcher
+from .foldermodel import FolderModel
+from .folderindex import openFolderIndex
+from .sorting import SortEngine
+from .foldertree import FolderTreeCache
+from .foldertree import NEXT
+from .foldertree import PREV
+from .treeindex import TreeIndex
+from .treeindex import walkTree
+from .timeline import getAbsoluteFrameAt
+from .timeline import getFrameAt
+from .progressive import ProgressiveLoader
 
 OPEN_NEXT = 0
 OPEN_PREV = 1
 
 SUPPORTED_STATIC = ['.png', '.jpg', '.jpeg', '.bmp', '.webp']
 SUPPORTED_ANIMATION = ['.gif']
+# Static formats which may be animated, played with Pillow
+SUPPORTED_PIL_ANIMATION = ['.webp', '.png']
 
 ANIMATION_RATE = 60.0  # 60 FPS (too high?)
 
 ANIMATION_DELAY = 1 / ANIMATION_RATE
 
-INOTIFY_TIMEOUT = 10  # Keep this number low
+INOTIFY_BATCH_DELAY = 100  # ms, folder changes within this delay are applied together
 
 SIZE_DIFF = 112  # This size diff is due to the HeaderBar
 
+MIN_DECODE_SIZE = 50  # Decode at native size if the window is smaller
+
+PROGRESSIVE_MIN_BYTES = 4 * 1024 * 1024  # Stream files bigger than this
+
+RENDITIONS_MAX = 4  # Scaled copies kept per image
+
+STREAMING_GIF_MIN_BYTES = 8 * 1024 * 1024  # Decode bigger GIFs while playing
+PIL_ANIMATION_FRAME_BUDGET = 16  # Used for WebP/APNG if the configured budget is 0
+
+NAVIGATION_SETTLE_DELAY = 80  # ms without navigation before decoding the target (key repeat ~30 ms)
+
 
 ## Inotify check
 def ifInotify(method):
@@ -72,54 +105,13 @@ if INOTIFY:
             # file moved from the folder
             self.process_IN_DELETE(event)
 
-        def process_IN_MOVED_IN(self, event):
+        def process_IN_MOVED_TO(self, event):
             # file moved in the folder
             self.process_IN_CREATE(event)
 
-## Animation cache
-
-## TODO: Find a way to associate pixbuf -> resized
-##             Note: The pixbufs are recycled in the animation
-##                         hence subsequent calls to iter_advance()
-##                         overwrite the memory of the old pixbufs
-
-CACHE_MAX_SIZE = 50
 USE_PIL_GIF = False
 
 
-class AnimationCache:
-
-    def __init__(self):
-        self.cache = {}
-
-    def getPixbuf(self, pixbuf, width, height):
-        if (pixbuf, width, height) in self.cache:
-            return self.cache[pixbuf, width, height]
-        else:
-            return self.addPixbuf(pixbuf, width, height)
-
-    def addPixbuf(self, pixbuf, width, height):
-        res = pixbuf.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
-        self.addToCache(res, pixbuf, width, height)
-        return res
-
-    def addToCache(self, res, pixbuf, width, height):
-        if len(self.cache) < CACHE_MAX_SIZE:
-            self.cache[pixbuf, width, height] = res
-        else:
-            if self.cleanCache(width, height):
-                self.cache[pixbuf, width, height] = res
-
-    def cleanCache(self, width, height):
-        # Delete a pixbuf with different size
-        for el in self.cache:
-            _, w, h = el
-            if w != width or h != height:
-                del self.cache[el]
-                return True
-        return False
-
-
 class GIFFrame:
 
     def __init__(self, delay, pixbuf):
@@ -133,90 +125,29 @@ class GIFFrame:
         return self.pixbuf
 
 
-# Calling pixbuf.scale_simple may cause a segmentation fault, see:
-# https://bugzilla.gnome.org/show_bug.cgi?id=747431
-def convertPilImageToGdkPixbuf(image, width=None, height=None):
-    if width is None:
-        width = image.size[0]
-    if height is None:
-        height = image.size[1]
-    data = GLib.Bytes(image.tobytes())
-    if len(image.getbands()) == 4:
-        has_alpha = True
-    else:
-        has_alpha = False
-    if has_alpha:
-        row_stride = 4 * width
-    else:
-        row_stride = 3 * width
-    return GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB, has_alpha, 8, width, height, row_stride)
-
-
 class GIFAnimation:
 
     def __init__(self, path):
         self.path = path
         self.img = Image.open(self.path)
-        self.cache = AnimationCache()
+        # Netscape loop count: None plays once, 0 loops forever
+        self.loop = self.img.info.get('loop')
         self.current_frame = -1
         self.start_time = -1
+        self.frame_ends = []
+        self.total_delay = 0
 
     def load(self):
         self.frames = []
-        prev = None
-        counter = 0
-        try:
-            while True:
-                current_image, duration = self.composeImage(self.img, prev)
-                counter += 1
-                prev = current_image
-                if duration > 0:
-                    # Create pixbuf
-                    pixbuf = convertPilImageToGdkPixbuf(current_image, self.image.size[0], self.image.size[1])
-                    # Add frame
-                    current_frame = GIFFrame(duration, pixbuf)
-                    self.frames.append(current_frame)
-                self.img.seek(self.img.tell() + 1)
-        except EOFError:
-            pass
-
-    def composeImage(self, img, prev):
-        # Extract data
-        duration = img.info['duration']
-        if 'background' in img.info:
-            background = self.img.info['background']
-        else:
-            background = None
-        if 'transparency' in img.info:
-            transparency = img.info['transparency']
-        else:
-            transparency = None
-        # Convert
-        img = img.convert('RGBA')
-        # Add transparency
-        # if transparency is not None:
-        #    img = self.addTransparency(img, transparency)
-        # Add background
-        if background is not None:
-            img = self.addTransparency(img, background)
-        # Stack with previous image
-        if prev is not None:
-            img = self.addBackground(img, prev)
-        return img, duration
-
-    def addBackground(self, img, background):
-        background.paste(img, (0, 0))
-        return background
-
-    def addTransparency(self, frame, trasparency):
-        mask = self.findMask(frame, trasparency)
-        img = frame.convert('RGBA')
-        img.putalpha(mask)
-        return img
-
-    def findMask(self, frame, trasparency):
-        img = frame.point(lambda x: 0 if x == trasparency else 255).convert('L')
-        return img
+        for current_image, duration in iterFrames(self.img):
+            # Create pixbuf
+            pixbuf = convertPilImageToGdkPixbuf(current_image)
+            # Add frame
+            current_frame = GIFFrame(duration, pixbuf)
+            self.frames.append(current_frame)
+        # frame_ends[i]: time (ms) when frame i ends, in a loop
+        self.frame_ends = list(itertools.accumulate(frame.getDelay() for frame in self.frames))
+        self.total_delay = self.frame_ends[-1] if len(self.frame_ends) > 0 else 0
 
     def isAnimated(self):
         return self.img.is_animated
@@ -230,9 +161,24 @@ class GIFAnimation:
     def getDelay(self):
         return self.frames[self.current_frame].getDelay()
 
-    def getPixbuf(self, width, height):
-        pixbuf = self.frames[self.current_frame].getPixbuf()
-        return self.cache.getPixbuf(pixbuf, width, height)
+    def getPixbuf(self):
+        return self.frames[self.current_frame].getPixbuf()
+
+    def getFrameIndex(self):
+        return self.current_frame
+
+    def getFrameCount(self):
+        return len(self.frames)
+
+    def getPlays(self):
+        # Number of times the animation is played, 0 for ever
+        if self.loop is None:
+            return 1
+        # Netscape loop count: repetitions after the first play
+        return 0 if self.loop == 0 else self.loop + 1
+
+    def close(self):
+        self.img.close()
 
     def advance(self, time=None):
         if time is None:
@@ -241,15 +187,11 @@ class GIFAnimation:
             self.start_time = time
             self.current_frame = 0
         else:
-            elapsed = (time - self.start_time) * 1000
-            diff = 0
-            frame_id = -1
-            while diff < elapsed:
-                frame_id += 1
-                frame_id = frame_id % len(self.frames)
-                frame = self.frames[frame_id]
-                diff += frame.getDelay()
-            self.current_frame = frame_id
+            self.current_frame = self.getFrameAt((time - self.start_time) * 1000)
+
+    def getFrameAt(self, elapsed):
+        # Frame shown elapsed ms after the start
+        return getFrameAt(self.frame_ends, elapsed, self.getPlays())
 
     ## Compatibility methods
     def is_static_image(self):
@@ -267,12 +209,113 @@ class GIFAnimation:
     def get_delay_time(self):
         return self.getDelay()
 
+    def get_pixbuf(self):
+        return self.getPixbuf()
+
+
+class StreamingGIFAnimation(GIFAnimation):
+    # Start playing after the first frame and decode
+    # at most frame_budget frames ahead (see StreamingFrames)
+
+    def __init__(self, path, frame_budget):
+        super().__init__(path)
+        self.frame_budget = frame_budget
+        self.stream = None
+        # Unknown until the end of the first pass
+        self.frame_count = None
+        self.current_pixbuf = None
+
+    def load(self):
+        self.stream = StreamingFrames(self.path, self.frame_budget)
+        self.current_frame = 0
+        self.current_pixbuf = self.stream.getPixbuf(0)
+        self.updateTimeline()
+
+    def updateTimeline(self):
+        if self.frame_count is not None:
+            return
+        delays, self.frame_count = self.stream.getTimeline(len(self.frame_ends))
+        for delay in delays:
+            self.total_delay += delay
+            self.frame_ends.append(self.total_delay)
+
+    def getFrameAt(self, elapsed):
+        # Absolute frame (loop * frame_count + index) shown after elapsed ms
+        if self.frame_count is None:
+            # First pass: wait for the decoder on the last decoded frame
+            return min(bisect.bisect_right(self.frame_ends, elapsed), len(self.frame_ends) - 1)
+        return getAbsoluteFrameAt(self.frame_ends, elapsed, self.getPlays())
+
+    def advance(self, time=None):
+        if time is None:
+            time = GLib.get_current_time()
+        if self.start_time == -1:
+            self.start_time = time
+            frame = 0
+        else:
+            self.updateTimeline()
+            frame = self.getFrameAt((time - self.start_time) * 1000)
+        self.stream.setPosition(frame)
+        self.stream.start()
+        pixbuf = self.stream.getPixbuf(frame)
+        if pixbuf is not None:
+            self.current_frame = frame
+            self.current_pixbuf = pixbuf
+
+    def getFrameIndex(self):
+        if self.frame_count is None:
+            return self.current_frame
+        return self.current_frame % self.frame_count
+
+    def getFrameCount(self):
+        if self.frame_count is None:
+            return self.frame_budget
+        return self.frame_count
+
+    def getDelay(self):
+        index = self.getFrameIndex()
+        start = self.frame_ends[index - 1] if index > 0 else 0
+        return self.frame_ends[index] - start
+
+    def getPixbuf(self):
+        return self.current_pixbuf
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+        super().close()
+
+
+class StreamingPILAnimation(StreamingGIFAnimation):
+    # Animated WebP and APNG
+
+    def getPlays(self):
+        # Here the loop count is the number of plays (0 for ever)
+        return 1 if self.loop is None else self.loop
+
 
 ## IWImage
 class IWImage:
 
-    def __init__(self, path):
+    def __init__(self, path, cache=None, max_size=None, progressive=False, frame_budget=0, folder_index=None,
+                 decode=True):
+        # decode=False: error image, nothing is read
         self.path = path
+        self.cache = cache
+        # Persistent index of the image sizes
+        self.folder_index = folder_index
+        # Frames decoded ahead when streaming big GIFs (0: never stream)
+        self.frame_budget = frame_budget
+        # Decode static images at most at this size (None: native size)
+        self.max_size = max_size
+        # Defer the decoding of static images to loadProgressive
+        self.progressive = progressive
+        self.is_loading = False
+        self.loader = None
+        # Power-of-two pyramid of self.pixbuf, filled lazily
+        self.mipmaps = []
+        # Keys of the scaled copies stored in the cache
+        self.rendition_keys = []
         self.position = -1
         _, extension = os.path.splitext(self.path)
         self.extension = extension.lower()
@@ -280,7 +323,8 @@ class IWImage:
         self.folder = os.path.dirname(self.path)
         self.is_static = True
         self.setError()
-        self.load()
+        if decode:
+            self.load()
 
     def setError(self):
         self.pixbuf = None
@@ -289,7 +333,11 @@ class IWImage:
         self.error_loading = True
 
     def load(self):
-        if self.extension in SUPPORTED_STATIC:
+        if self.extension in SUPPORTED_PIL_ANIMATION and isAnimatedFile(self.path):
+            self.loadAnimation()
+        elif self.progressive and self.canLoadProgressive():
+            self.prepareProgressive()
+        elif self.extension in SUPPORTED_STATIC:
             self.loadStaticImage()
         elif self.extension in SUPPORTED_ANIMATION:
             self.loadAnimation()
@@ -298,34 +346,176 @@ class IWImage:
 
     def loadStaticImage(self):
         try:
-            self.pixbuf = self._loadPixbuf()
-            self.size = (self.pixbuf.get_width(), self.pixbuf.get_height())
+            self.size = self._probeSize()
+            self.pixbuf = self._loadCachedPixbuf(self._getDecodeSize())
+            if self.size is None:
+                self.size = (self.pixbuf.get_width(), self.pixbuf.get_height())
             self.is_resizable = True
             self.error_loading = False
             self.is_static = True
         except Exception:
             self.setError()
 
-    def _loadPixbuf(self):
+    def canLoadProgressive(self):
+        # WebP is decoded with PIL
+        return self.extension in SUPPORTED_STATIC and self.extension != '.webp'
+
+    def prepareProgressive(self):
+        try:
+            self.size = self._probeSize()
+            size = self._getDecodeSize()
+            pixbuf = None
+            if self.cache is not None:
+                pixbuf = self.cache.get(self._getCacheKey(size))
+            if pixbuf is not None:
+                self._setStaticPixbuf(pixbuf)
+            else:
+                # Wait for loadProgressive
+                self.is_loading = True
+                self.is_static = True
+                self.error_loading = False
+        except Exception:
+            self.setError()
+
+    def loadProgressive(self, on_update, on_done):
+        # on_update(partial_pixbuf) is called while the image is decoded,
+        # on_done(image) when the loading is complete
+        size = self._getDecodeSize()
+
+        def done(pixbuf):
+            self.loader = None
+            self.is_loading = False
+            if pixbuf is None:
+                # Not supported by the loader, try the slow path
+                self.loadStaticImage()
+            else:
+                if self.cache is not None:
+                    self.cache.put(self._getCacheKey(size), pixbuf)
+                self._setStaticPixbuf(pixbuf)
+            on_done(self)
+
+        self.loader = ProgressiveLoader(self.path, size, on_update=on_update, on_done=done)
+        try:
+            self.loader.start()
+        except OSError:
+            self.loader = None
+            self.is_loading = False
+            self.setError()
+            on_done(self)
+
+    def cancelLoad(self):
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+
+    def isLoading(self):
+        return self.is_loading
+
+    def _setStaticPixbuf(self, pixbuf):
+        self.pixbuf = pixbuf
+        if self.size is None:
+            self.size = (pixbuf.get_width(), pixbuf.get_height())
+        self.is_resizable = True
+        self.error_loading = False
+        self.is_static = True
+
+    def _probeSize(self):
+        if self.folder_index is None:
+            return self._readSize()
+        stat = os.stat(self.path)
+        size = self.folder_index.getImageSize(self.path, stat)
+        if size is None:
+            size = self._readSize()
+            self.folder_index.putImageSize(self.path, stat, *size)
+        return size
+
+    def _readSize(self):
+        # Read the image size from the header only
+        info = GdkPixbuf.Pixbuf.get_file_info(self.path)
+        if info is not None and info[0] is not None:
+            _, width, height = info
+            return width, height
+        with Image.open(self.path) as img:
+            return img.size
+
+    def _getDecodeSize(self):
+        # Size to decode the image at, None for native size
+        if self.max_size is None or self.size is None:
+            return None
+        width, height = self.size
+        max_width, max_height = self.max_size
+        if width <= max_width and height <= max_height:
+            return None
+        factor = min(max_width / width, max_height / height)
+        return max(int(width * factor), 1), max(int(height * factor), 1)
+
+    def isFullResolution(self):
+        return self.pixbuf.get_width() >= self.size[0] and self.pixbuf.get_height() >= self.size[1]
+
+    def loadFullResolution(self):
+        self.pixbuf = self._loadCachedPixbuf()
+
+    def _getCacheKey(self, size=None):
+        return self.cache.getKey(self.path) + (size,)
+
+    def _loadCachedPixbuf(self, size=None):
+        if self.cache is None:
+            return self._loadPixbuf(size)
+        key = self._getCacheKey(size)
+        pixbuf = self.cache.get(key)
+        if pixbuf is None:
+            pixbuf = self._loadPixbuf(size)
+            self.cache.put(key, pixbuf)
+        return pixbuf
+
+    def _loadPixbuf(self, size=None):
         if self.extension == '.webp':
-            pixbuf = convertPilImageToGdkPixbuf(Image.open(self.path))
+            pixbuf = convertPilImageToGdkPixbuf(self._loadPilImage(size))
         else:
             try:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file(self.path)
+                if size is None:
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_file(self.path)
+                else:
+                    width, height = size
+                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(self.path, width, height, True)
             except Exception:
-                pixbuf = convertPilImageToGdkPixbuf(Image.open(self.path))
+                pixbuf = convertPilImageToGdkPixbuf(self._loadPilImage(size))
         return pixbuf
 
+    def _loadPilImage(self, size=None):
+        img = Image.open(self.path)
+        if size is not None:
+            # JPEG: let the decoder scale by 1/2, 1/4 or 1/8 (DCT scaling)
+            img.draft('RGB', size)
+            factor = min(img.size[0] // size[0], img.size[1] // size[1])
+            if factor > 1:
+                img = normalizeMode(img).reduce(factor)
+        return img
+
     def loadAnimation(self):
         try:
-            if USE_PIL_GIF:
+            use_pil = True
+            if self.extension in SUPPORTED_PIL_ANIMATION:
+                frame_budget = self.frame_budget or PIL_ANIMATION_FRAME_BUDGET
+                self.animation = StreamingPILAnimation(self.path, frame_budget)
+            elif self.isStreamingAnimation():
+                self.animation = StreamingGIFAnimation(self.path, self.frame_budget)
+            elif USE_PIL_GIF:
                 self.animation = GIFAnimation(self.path)
             else:
+                use_pil = False
                 self.animation = GdkPixbuf.PixbufAnimation.new_from_file(self.path)
             if self.animation.is_static_image():
                 self.loadStaticImage()
             else:
-                self.animation_iter = self.animation.get_iter()
+                if use_pil:
+                    self.animation.load()
+                    self.animation_iter = self.animation.get_iter()
+                    frame_count = self.animation.getFrameCount()
+                else:
+                    frame_count = self._countFrames()
+                    self.animation_iter = PixbufAnimationPlayer(self.animation, frame_count)
+                self.frame_store = AnimationFrameStore(frame_count)
                 self.size = (self.animation.get_width(), self.animation.get_height())
                 self.animation_size = self.size
                 self.is_resizable = True
@@ -334,6 +524,18 @@ class IWImage:
         except Exception:
             self.setError()
 
+    def isStreamingAnimation(self):
+        return self.frame_budget > 0 and os.path.getsize(self.path) >= STREAMING_GIF_MIN_BYTES
+
+    def release(self):
+        # The image is not shown anymore
+        if self.isAnimation() and isinstance(self.animation, GIFAnimation):
+            self.animation.close()
+
+    def _countFrames(self):
+        with Image.open(self.path) as img:
+            return getattr(img, 'n_frames', 1)
+
     def isAnimation(self):
         return not self.error_loading and not self.is_static
 
@@ -343,24 +545,80 @@ class IWImage:
     def isError(self):
         return self.error_loading
 
-    def scale(self, width, height):
+    def getSourcePixbuf(self, width, height):
+        # Pixbuf to scale from to obtain a width x height image
+        if width > self.pixbuf.get_width() or height > self.pixbuf.get_height():
+            if not self.isFullResolution():
+                # Zoomed past the decoded resolution
+                self.loadFullResolution()
+        return self.pixbuf
+
+    def getMipmap(self, width, height):
+        # Smallest level of the pyramid which is at least width x height
+        if len(self.mipmaps) == 0 or self.mipmaps[0] is not self.pixbuf:
+            self.mipmaps = [self.pixbuf]
+        index = 0
+        while True:
+            level = self.mipmaps[index]
+            next_width = level.get_width() // 2
+            next_height = level.get_height() // 2
+            if next_width < max(width, 1) or next_height < max(height, 1):
+                return level
+            if index + 1 == len(self.mipmaps):
+                # TILES averages the source pixels (box filter) when reducing
+                self.mipmaps.append(scaleParallel(level, next_width, next_height, GdkPixbuf.InterpType.TILES))
+            index += 1
+
+    def scale(self, width, height, interp=GdkPixbuf.InterpType.BILINEAR):
         if self.isStatic():
-            return self.pixbuf.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+            self.getSourcePixbuf(width, height)
+            source = self.getMipmap(width, height)
+            if width == source.get_width() and height == source.get_height():
+                return source
+            if interp != GdkPixbuf.InterpType.BILINEAR:
+                # Previews are not worth caching
+                return source.scale_simple(width, height, interp)
+            pixbuf = self._getRendition(width, height)
+            if pixbuf is None:
+                pixbuf = scaleParallel(source, width, height, interp)
+                self._putRendition(width, height, pixbuf)
+            return pixbuf
         elif self.isAnimation():
             self.animation_size = (width, height)
             return None
         else:
             return None
 
-    def getAnimationPixbuf(self):
-        self.animation_iter.advance()
+    def _getRendition(self, width, height):
+        if self.cache is None:
+            return None
+        try:
+            key = getRenditionKey(self._getCacheKey(), width, height)
+        except OSError:
+            return None
+        return self.cache.get(key)
+
+    def _putRendition(self, width, height, pixbuf):
+        if self.cache is None:
+            return
+        try:
+            key = getRenditionKey(self._getCacheKey(), width, height)
+        except OSError:
+            return
+        self.cache.put(key, pixbuf)
+        if key in self.rendition_keys:
+            self.rendition_keys.remove(key)
+        self.rendition_keys.append(key)
+        while len(self.rendition_keys) > RENDITIONS_MAX:
+            self.cache.remove(self.rendition_keys.pop(0))
+
+    def getAnimationPixbuf(self, time=None):
+        # time: playback time in seconds
+        self.animation_iter.advance(time)
         width, height = self.animation_size
-        # Get Pixbuf
-        if USE_PIL_GIF:
-            res_pixbuf = self.animation.getPixbuf(width, height)
-        else:
-            pixbuf = self.animation_iter.get_pixbuf()
-            res_pixbuf = pixbuf.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+        # Get Pixbuf, scaled once per frame and size
+        index = self.animation_iter.getFrameIndex()
+        res_pixbuf = self.frame_store.getFrame(index, width, height, self.animation_iter.get_pixbuf)
         return self.animation_iter, res_pixbuf
 
     def isResizable(self):
@@ -394,21 +652,57 @@ class IWImage:
 # Image Viewer
 class ImageViewer:
 
-    def __init__(self, application: Gtk.Application, config, shuffle=False, slideshow: bool = False):
+    def __init__(self, application: Gtk.Application, config, shuffle=False, slideshow: bool = False,
+                 recursive: bool = False):
         self.application = application
         self.config = config
         self.interface = self.setupInterface()
         self.current_image = None
-        self.files_in_folder = []
+        self.files_in_folder = FolderModel()
+        # Background folder listing
+        self.folder_listing_id = 0
+        self.folder_listing = False
+        self.sort_engine = SortEngine(self.config.getSortOrder())
+        # Listings kept between runs
+        self.folder_index = None
+        if self.config.useFolderIndex():
+            # A listing depends on the order and on the extensions listed
+            extensions = ' '.join(sorted(SUPPORTED_STATIC + SUPPORTED_ANIMATION))
+            tag = '%s %s' % (self.sort_engine.getTag(), extensions)
+            self.folder_index = openFolderIndex(self.config.getConfigFolder(), tag)
+        # Sibling folders, for the navigation across folders
+        self.folder_tree = FolderTreeCache(self.readFolder)
+        self.siblings_folder = None
+        # Recursive mode: navigate all the images under root_folder
+        self.recursive = recursive
+        self.root_folder = None
         self.shuffle = shuffle
         self.init_slideshow = slideshow
+        # Decoded images cache
+        self.image_cache = ImageCache(self.config.getCacheSizeBytes())
+        self.decode_size = None
+        self.animation_frame_budget = self.config.getAnimationFrameBudget()
+        # Prefetch
+        next_count, prev_count = self.config.getPrefetchWindow()
+        self.prefetcher = ImagePrefetcher(self.loadImage, next_count, prev_count)
+        # Navigation: the target is decoded only when the user stops on it
+        self.navigation_id = 0
+        self.navigation_target = None
+        self.navigation_timeout = None
+        self.navigation_future = None
+        self.navigation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='iw-navigation')
         # Inotify
         if INOTIFY:
             self.pyinotify_wm = pyinotify.WatchManager()
             self.pyinotify_mask = pyinotify.IN_DELETE | pyinotify.IN_CREATE | pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO
             handler = InotifyEventHandler(self)
-            self.pyinotify_notifier = pyinotify.Notifier(self.pyinotify_wm, handler, timeout=INOTIFY_TIMEOUT)
+            # Events are read when the inotify fd is readable (see Interface.start)
+            self.pyinotify_notifier = pyinotify.Notifier(self.pyinotify_wm, handler)
+            # Watched folder -> watch descriptor
             self.pyinotify_wdd = {}
+        # Folder changes waiting to be applied, (added, path)
+        self.folder_changes = []
+        self.folder_changes_timeout = None
 
     def setupInterface(self):
         width, height, isFullscreen = self.config.getWindowLastStatus()
@@ -421,31 +715,118 @@ class ImageViewer:
 
     ## START
     def start(self, imagepath=None):
+        if self.recursive and imagepath is not None:
+            self.root_folder = imagepath if os.path.isdir(imagepath) else os.path.dirname(imagepath)
         imagepath = self._get_image(imagepath)
         if imagepath is not None:
             current_folder = os.path.dirname(imagepath)
-            self.current_image = self.openImage(imagepath)
-            self.setFilesInFolder(self.readFolder(current_folder))
+            # Show the image now, the folder is listed in the background
+            self.current_image = self.openImage(imagepath, position=-1)
             self.inotifyAdd(current_folder)
-            self.setCurrentImagePosition()
+            self.readFolderAsync(self.getNavigationFolder())
+        elif self.root_folder is not None:
+            # The first image is opened once the tree is walked
+            self.readFolderAsync(self.root_folder)
         self.interface.start(self.current_image, init_slideshow=self.init_slideshow)
 
     def _get_image(self, path: str) -> str | None:
         if path is None:
             return None
         if os.path.isdir(path):
-            # pick the first file in the folder
-            files = os.listdir(path)
-            files.sort()
-            if len(files) == 0:
-                return None
-            image_name = files[0]
-            imagepath = os.path.join(path, image_name)
+            # pick the first image of the folder in the sort order
+            # (any image when shuffled)
+            first, first_key = None, None
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not self.isImageEntry(entry):
+                        continue
+                    if self.shuffle:
+                        return entry.path
+                    key = self.sort_engine.getEntryKey(entry)
+                    if first is None or key < first_key:
+                        first, first_key = entry.path, key
+            return first
         else:
             imagepath = path
         return imagepath
 
+    def readFolderAsync(self, folder):
+        # List folder in a thread, then update the navigation on the main loop
+        self.folder_listing_id += 1
+        self.folder_listing = True
+        listing_id = self.folder_listing_id
+
+        def run():
+            try:
+                files = self.readTree(folder) if self.recursive else self.readFolder(folder)
+                if self.shuffle:
+                    # O(n), kept off the main loop
+                    files.shuffle()
+            except OSError:
+                files = FolderModel()
+            GLib.idle_add(self.onFolderRead, listing_id, folder, files)
+
+        threading.Thread(target=run, name='iw-listing', daemon=True).start()
+
+    def onFolderRead(self, listing_id, folder, files):
+        if listing_id != self.folder_listing_id:
+            # Stale listing
+            return False
+        self.folder_listing = False
+        if self.current_image is None:
+            if self.recursive and len(files) > 0:
+                self.setFilesInFolder(files)
+                self.openFirstImage()
+        elif self.getNavigationFolder() == folder:
+            self.setFilesInFolder(files)
+            self.updateFolderData()
+        # Changes seen while listing, the listing may have missed them
+        self.flushFolderChanges()
+        return False
+
+    def openFirstImage(self):
+        path = os.path.join(self.getNavigationFolder(), self.files_in_folder[0])
+        self.current_image = self.openImage(path, 0)
+        self.inotifyAdd(os.path.dirname(path))
+        self.interface.openImage(self.current_image)
+        self.updateFolderData()
+
+    def getNavigationFolder(self):
+        # Folder the navigation names are relative to
+        if self.recursive:
+            return self.root_folder
+        return os.path.dirname(self.getCurrentPath())
+
+    def getCurrentPath(self):
+        # Image the user is on, even if not decoded yet
+        if self.navigation_target is not None:
+            return self.navigation_target[0]
+        return self.current_image.getFilepath()
+
+    def getCurrentPosition(self):
+        if self.navigation_target is not None:
+            return self.navigation_target[1]
+        return self.current_image.getPosition()
+
+    def getNavigationName(self, path):
+        if self.recursive:
+            return os.path.relpath(path, self.root_folder)
+        return os.path.basename(path)
+
+    def isListingFolder(self):
+        return self.folder_listing
+
     def close(self):
+        self.cancelFolderChanges()
+        self.cancelNavigation()
+        self.navigation_executor.shutdown(wait=False, cancel_futures=True)
+        self.inotifyClose()
+        self.folder_tree.close()
+        self.prefetcher.close()
+        if DEBUG_STATS:
+            self.printCacheStats()
+        if self.folder_index is not None:
+            self.folder_index.close()
         # save last window size
         width, height = self.interface.getSize()
         isFullscreen = self.interface.getFullscreen()
@@ -458,12 +839,34 @@ class ImageViewer:
 
     @ifInotify
     def inotifyAdd(self, path):
-        self.pyinotify_wdd = self.pyinotify_wm.add_watch(path, self.pyinotify_mask, rec=False)
+        if path in self.pyinotify_wdd:
+            return
+        wdd = self.pyinotify_wm.add_watch(path, self.pyinotify_mask, rec=False)
+        # Only one path is watched (rec=False), a negative descriptor is an error
+        wd = next(iter(wdd.values()), -1)
+        if wd > 0:
+            self.pyinotify_wdd[path] = wd
 
     @ifInotify
     def inotifyRemove(self, path):
-        if self.pyinotify_wdd[path] > 0:
-            self.pyinotify_wm.rm_watch(self.pyinotify_wdd[path])
+        wd = self.pyinotify_wdd.pop(path, -1)
+        if wd > 0:
+            self.pyinotify_wm.rm_watch(wd)
+
+    @ifInotify
+    def inotifyClose(self):
+        for path in list(self.pyinotify_wdd):
+            self.inotifyRemove(path)
+        self.pyinotify_notifier.stop()
+
+    @ifInotify
+    def getInotifyFd(self):
+        return self.pyinotify_wm.get_fd()
+
+    @ifInotify
+    def processInotifyEvents(self):
+        self.pyinotify_notifier.read_events()
+        self.pyinotify_notifier.process_events()
 
     def openNextImage(self, **kwargs):
         self.openNearImage(OPEN_NEXT, **kwargs)
@@ -472,9 +875,11 @@ class ImageViewer:
         self.openNearImage(OPEN_PREV, **kwargs)
 
     def openNearImage(self, open_type, loop_mode: bool = False):
-        current_name = self.current_image.getName()
-        current_folder = self.current_image.getFolder()
-        current_position = self.current_image.getPosition()
+        if self.isListingFolder():
+            # Position unknown until the folder is listed
+            return
+        current_folder = os.path.dirname(self.getCurrentPath())
+        current_position = self.getCurrentPosition()
         # set up new image variables
         new_image = None
         if open_type == OPEN_NEXT:
@@ -487,115 +892,238 @@ class ImageViewer:
 
         # get new image
         if 0 <= new_position < len(self.files_in_folder):
-            new_image = os.path.join(current_folder, self.files_in_folder[new_position])
+            new_image = os.path.join(self.getNavigationFolder(), self.files_in_folder[new_position])
         else:
             new_image = None
             new_position = -1
 
         # open parallel folder if necessary
-        if new_image is None:
-            new_image, new_position = self.openUpperFolder(open_type)
-            if new_image is not None:
-                # update inotify
-                self.inotifyRemove(current_folder)
-                self.inotifyAdd(os.path.dirname(new_image))
+        if new_image is None and not self.recursive:
+            new_image, new_position = self.openUpperFolder(open_type, current_folder)
+
+        if new_image is not None and os.path.dirname(new_image) != current_folder:
+            # update inotify
+            self.inotifyRemove(current_folder)
+            self.inotifyAdd(os.path.dirname(new_image))
 
-        # set new current image and open with the interface
         if new_image is not None:
-            self.current_image = self.openImage(new_image, new_position)
-            self.interface.openImage(self.current_image)
-
-    def openUpperFolder(self, get):
-        # Get all the files/folders
-        folder = os.path.dirname(self.current_image.getFolder())
-        current_folder_name = os.path.basename(self.current_image.getFolder())
-        files = self.getFoldersIn(folder)
-        # Reverse the array if get prev
-        if get == OPEN_PREV:
-            files.reverse()
-        # Get the first valid element
-        next = False
-        element = None
-        for filename in files:
-            if filename == current_folder_name:
-                next = True
-            elif next:
-                # read folder
-                candidate_path = os.path.join(folder, filename)
-                el_files = self.readFolder(candidate_path)
-                if len(el_files) > 0:
-                    self.setFilesInFolder(el_files)
-                    position = 0 if get == OPEN_NEXT else -1
-                    element = os.path.join(candidate_path, el_files[position])
-                    break
-        # get element position
-        if element is None:
-            position = -1
-        elif get == OPEN_NEXT:
-            position = 0
-        elif get == OPEN_PREV:
-            position = len(self.files_in_folder) - 1
+            self.navigateTo(new_image, new_position)
+
+    def navigateTo(self, path, position):
+        # Move to path at once, decode it only if the user stops there
+        self.cancelNavigation()
+        img = self.prefetcher.takeIfDone(path)
+        if img is not None:
+            # Already decoded
+            self.showImage(img, position)
+            return
+        self.navigation_target = (path, position)
+        # Abandon the decoding of the images skipped
+        self.prefetcher.retain([path])
+        self.interface.showNavigationTarget(path, position)
+        self.navigation_timeout = GLib.timeout_add(NAVIGATION_SETTLE_DELAY, self.loadNavigationTarget)
+
+    def loadNavigationTarget(self):
+        self.navigation_timeout = None
+        path, _ = self.navigation_target
+        navigation_id = self.navigation_id
+        self.updateDecodeSize()
+        future = self.prefetcher.takeFuture(path)
+        if future is None or future.cancelled():
+            future = self.navigation_executor.submit(self.loadImage, path, self.isLargeFile(path))
+        self.navigation_future = future
+
+        def done(future):
+            GLib.idle_add(self.onNavigationLoaded, navigation_id, future)
+
+        future.add_done_callback(done)
+        return False
+
+    def onNavigationLoaded(self, navigation_id, future):
+        if navigation_id != self.navigation_id or future.cancelled() or self.navigation_target is None:
+            # The user moved on
+            return False
+        path, _ = self.navigation_target
+        self.navigation_target = None
+        self.navigation_future = None
+        try:
+            img = future.result()
+        except Exception:
+            # Shown as an error, without decoding again on the main loop
+            img = IWImage(path, decode=False)
+        # The folder may have changed while decoding
+        self.showImage(img, self.getFilePosition(path))
+        return False
+
+    def cancelNavigation(self):
+        # NOTE: a decode already running cannot be stopped, its result is dropped
+        # (callbacks already queued see another navigation id)
+        self.navigation_id += 1
+        if self.navigation_timeout is not None:
+            GLib.source_remove(self.navigation_timeout)
+            self.navigation_timeout = None
+        if self.navigation_future is not None:
+            self.navigation_future.cancel()
+            self.navigation_future = None
+        self.navigation_target = None
+
+    def isNavigating(self):
+        return self.navigation_target is not None
+
+    def showImage(self, img, position):
+        # set new current image and open with the interface
+        img.setPosition(position)
+        self.current_image = img
+        self.interface.openImage(self.current_image)
+        self.prefetchNeighbours()
+
+    def openUpperFolder(self, get, current_folder):
+        # Get the closest sibling folder with images
+        direction = NEXT if get == OPEN_NEXT else PREV
+        folder, files = self.folder_tree.getSibling(current_folder, direction)
+        if folder is None:
+            return None, -1
+        # The cached listing is shared
+        self.setFilesInFolder(files.copy())
+        position = 0 if get == OPEN_NEXT else len(self.files_in_folder) - 1
+        element = os.path.join(folder, self.files_in_folder[position])
         # element is the new image,
         # position is its index in the folder files
         return element, position
 
     def openImage(self, path, position=None):
-        img = IWImage(path)
+        self.updateDecodeSize()
+        img = self.prefetcher.take(path)
+        if img is None:
+            img = self.loadImage(path, progressive=self.isLargeFile(path))
         if position is None:
             # get image position
             position = self.getFilePosition(path)
         img.setPosition(position)
         return img
 
+    def loadImage(self, path, progressive=False):
+        # NOTE: called from the prefetch workers too
+        return IWImage(path,
+                       cache=self.image_cache,
+                       max_size=self.decode_size,
+                       progressive=progressive,
+                       frame_budget=self.animation_frame_budget,
+                       folder_index=self.folder_index)
+
+    def isLargeFile(self, path):
+        try:
+            return os.path.getsize(path) >= PROGRESSIVE_MIN_BYTES
+        except OSError:
+            return False
+
+    def updateDecodeSize(self):
+        # NOTE: read on the main thread, the workers only use the stored value
+        width, height = self.interface.getFitSize()
+        if width < MIN_DECODE_SIZE or height < MIN_DECODE_SIZE:
+            # Window not allocated yet
+            width, height = self.interface.getSize()
+            height -= SIZE_DIFF
+        if width < MIN_DECODE_SIZE or height < MIN_DECODE_SIZE:
+            self.decode_size = None
+        else:
+            self.decode_size = (int(width), int(height))
+
+    def getCacheStats(self):
+        return self.image_cache.getStats()
+
+    def printCacheStats(self):
+        stats = self.getCacheStats()
+        lookups = stats['hits'] + stats['misses']
+        print('image cache: %d hits, %d misses (%.0f%% hits), %d evictions, %d entries, %.1f / %.1f MB'
+              % (stats['hits'], stats['misses'], 100 * stats['hits'] / lookups if lookups > 0 else 0,
+                 stats['evictions'], stats['entries'], stats['bytes'] / 2 ** 20, stats['max_bytes'] / 2 ** 20),
+              file=sys.stderr)
+
+    def prefetchNeighbours(self):
+        if self.current_image is None or self.isNavigating():
+            # Resumed once the navigation target is shown
+            return
+        folder = self.getNavigationFolder()
+        position = self.current_image.getPosition()
+        if not self.recursive and folder != self.siblings_folder:
+            self.siblings_folder = folder
+            self.folder_tree.prefetchSiblings(folder, self.onSiblingsRead)
+        edges = self.getEdgeImages(folder, position)
+        self.prefetcher.update(folder, self.files_in_folder, position, edges)
+        # Scaled copies are only kept for the navigation window
+        window = self.prefetcher.getWindow(folder, self.files_in_folder, position) + edges
+        window.append(self.current_image.getFilepath())
+        self.image_cache.removeRenditions(set(os.path.realpath(path) for path in window))
+
+    def onSiblingsRead(self, folder):
+        # NOTE: called from the folder tree worker
+        def update():
+            if folder == self.siblings_folder:
+                self.prefetchNeighbours()
+            return False
+
+        GLib.idle_add(update)
+
+    def getEdgeImages(self, folder, position):
+        # Images of the sibling folders reached by the prefetch window
+        if self.shuffle or self.recursive or position < 0:
+            return []
+        edges = []
+        next_count, prev_count = self.prefetcher.next_count, self.prefetcher.prev_count
+        if next_count > 0 and position + next_count >= len(self.files_in_folder):
+            sibling, files = self.folder_tree.peekSibling(folder, NEXT)
+            if sibling is not None:
+                edges.append(os.path.join(sibling, files[0]))
+        if prev_count > 0 and position - prev_count < 0:
+            sibling, files = self.folder_tree.peekSibling(folder, PREV)
+            if sibling is not None:
+                edges.append(os.path.join(sibling, files[-1]))
+        return edges
+
     def getFilePosition(self, path):
         # NOTE: assume self.files_in_folder is correct
-        basename = os.path.basename(path)
-        if basename in self.files_in_folder:
-            return self.files_in_folder.index(basename)
-        else:
-            # error
-            return -1
+        return self.files_in_folder.getPosition(self.getNavigationName(path))
 
     def isSupportedExtension(self, ext):
         return ext.lower() in SUPPORTED_STATIC or ext.lower() in SUPPORTED_ANIMATION
 
-    def getFoldersIn(self, folder):
-        folders = {}
-        for filename in os.listdir(folder):
-            filepath = os.path.join(folder, filename)
-            if os.path.isdir(filepath):
-                f_lower = filename.lower()
-                if f_lower not in folders:
-                    folders[f_lower] = list()
-                folders[f_lower].append(filename)
-        folders_keys = natsorted(folders.keys())
-        sorted_files = list()
-        for el in folders_keys:
-            fls = folders[el]
-            fls.sort()
-            sorted_files.extend(fls)
-        return sorted_files
+    def isImageEntry(self, entry):
+        # entry: os.DirEntry, is_dir() uses d_type and does not need a stat
+        if entry.name[0] == '.':
+            return False
+        _, ext = os.path.splitext(entry.name)
+        return self.isSupportedExtension(ext) and not entry.is_dir()
+
+    def isImagePath(self, path):
+        filename = os.path.basename(path)
+        if filename[0] == '.':
+            return False
+        _, ext = os.path.splitext(filename)
+        return self.isSupportedExtension(ext) and not os.path.isdir(path)
 
     def readFolder(self, folder):
-        all_files = os.listdir(folder)
-        valid_files = {}
-        for filename in all_files:
-            if filename[0] == '.':
-                continue
-            _, ext = os.path.splitext(filename)
-            if self.isSupportedExtension(ext):
-                f_lower = filename.lower()
-                if f_lower not in valid_files:
-                    valid_files[f_lower] = list()
-                valid_files[f_lower].append(filename)
-        valid_files_keys = natsorted(valid_files.keys())
-        # Compose
-        sorted_files = []
-        for el in valid_files_keys:
-            fls = valid_files[el]
-            fls.sort()
-            sorted_files.extend(fls)
-        return sorted_files
+        # Return the images of folder as a sorted FolderModel
+        # NOTE: the mtime is read first, a change while listing invalidates the listing
+        mtime = os.stat(folder).st_mtime_ns
+        # Editing a file changes its mtime/size but not the folder mtime,
+        # only the name order can be validated by the index
+        use_index = self.folder_index is not None and self.sort_engine.isNameOrder()
+        if use_index:
+            names = self.folder_index.getListing(folder, mtime)
+            if names is not None:
+                return FolderModel(names, is_sorted=True)
+        with os.scandir(folder) as entries:
+            keys = {entry.name: self.sort_engine.getEntryKey(entry)
+                    for entry in entries if self.isImageEntry(entry)}
+        model = FolderModel(keys, get_key=self.sort_engine.getKeyFunction(folder), keys=keys)
+        if use_index:
+            self.folder_index.putListing(folder, mtime, model.getSorted())
+        return model
+
+    def readTree(self, root):
+        # Return the images under root as a sorted TreeIndex
+        return TreeIndex(root, walkTree(root, self.isImageEntry))
 
     '''
     def removeFoldersFromArray(self, files):
@@ -611,50 +1139,102 @@ class ImageViewer:
     '''
 
     def setCurrentImagePosition(self):
-        basename = self.current_image.getName()
-        if basename in self.files_in_folder:
-            position = self.files_in_folder.index(basename)
-            self.current_image.setPosition(position)
+        if self.navigation_target is not None:
+            # The image shown is replaced once the target is decoded
+            path, _ = self.navigation_target
+            self.navigation_target = (path, self.getFilePosition(path))
         else:
-            self.current_image.setPosition(-1)
+            self.current_image.setPosition(self.getFilePosition(self.current_image.getFilepath()))
 
     def getTotImages(self):
         return len(self.files_in_folder)
 
     def addToFilelist(self, path):
-        # TODO: better, this is kinda lazy
-        current_folder = os.path.dirname(path)
-        self.setFilesInFolder(self.readFolder(current_folder))
-        # update interface
-        self.updateFolderData()
+        self.queueFolderChange(True, path)
+
+    def queueFolderChange(self, added, path):
+        # Bursts of events cost a single update of the interface
+        self.folder_changes.append((added, path))
+        if self.folder_changes_timeout is None:
+            self.folder_changes_timeout = GLib.timeout_add(INOTIFY_BATCH_DELAY, self.applyFolderChanges)
+
+    def flushFolderChanges(self):
+        if len(self.folder_changes) == 0:
+            return
+        if self.folder_changes_timeout is not None:
+            GLib.source_remove(self.folder_changes_timeout)
+        self.applyFolderChanges()
+
+    def applyFolderChanges(self):
+        self.folder_changes_timeout = None
+        if self.isListingFolder():
+            # Kept for onFolderRead, the model is replaced by the listing
+            return False
+        changes = self.folder_changes
+        self.folder_changes = []
+        if self.current_image is None:
+            return False
+        current_folder = os.path.abspath(os.path.dirname(self.getCurrentPath()))
+        # Last event of each name wins
+        events = {}
+        for added, path in changes:
+            if os.path.dirname(os.path.abspath(path)) != current_folder:
+                # Event of a folder we are not showing anymore
+                continue
+            events[path] = added
+        added = [self.getNavigationName(path) for path, is_added in events.items()
+                 if is_added and self.isImagePath(path)]
+        removed = [self.getNavigationName(path) for path, is_added in events.items() if not is_added]
+        # Sorted positions, or random ones if shuffled
+        changed = self.files_in_folder.update(added, removed)
+        if changed:
+            self.forgetFolderListing()
+            # update interface
+            self.updateFolderData()
+        return False
+
+    def forgetFolderListing(self):
+        # Only complete scans are stored (see readFolder): after a change
+        # the listing is dropped, the next scan of the folder stores it again.
+        # NOTE: the new folder mtime invalidates it too, unless the change
+        # happened within the mtime resolution of the scan
+        if self.folder_index is None or self.recursive or self.isListingFolder():
+            return
+        self.folder_index.removeListing(os.path.dirname(self.getCurrentPath()))
+
+    def cancelFolderChanges(self):
+        if len(self.folder_changes) > 0 and self.folder_index is not None and self.current_image is not None:
+            # The stored listing may already have the mtime of these changes
+            self.folder_index.removeListing(os.path.dirname(self.getCurrentPath()))
+        self.folder_changes = []
+        if self.folder_changes_timeout is not None:
+            GLib.source_remove(self.folder_changes_timeout)
+            self.folder_changes_timeout = None
 
     def setFilesInFolder(self, files):
         if self.shuffle:
-            # Re-shuffle, but keep the current image as first
-            removed_current = False
-            if self.current_image is not None and self.current_image.getName() in files:
-                files.remove(self.current_image.getName())
-                removed_current = True
-            random.shuffle(files)
-            if removed_current:
-                files.insert(0, self.current_image.getName())
+            # Keep the current image as first
+            first = None
+            if self.current_image is not None or self.isNavigating():
+                first = self.getNavigationName(self.getCurrentPath())
+            if not files.shuffled:
+                files.shuffle(first)
+            elif first is not None:
+                files.setFirst(first)
         self.files_in_folder = files
 
     def removeFromFilelist(self, path):
-        filename = os.path.basename(path)
-        if filename in self.files_in_folder:
-            self.files_in_folder.remove(filename)
-            # update interface
-            self.updateFolderData()
+        self.queueFolderChange(False, path)
 
     def updateFolderData(self):
         self.setCurrentImagePosition()
-        self.interface.fillInfo()
+        self.prefetchNeighbours()
+        self.interface.fillNavigatorInfo()
 
     def folderIsEmpty(self, folder):
         return len(os.listdir(folder)) == 0
 
 
-def new(application, config_folder, shuffle, slideshow: bool):
+def new(application, config_folder, shuffle, slideshow: bool, recursive: bool = False):
     config = readConfig(config_folder)
-    return ImageViewer(application, config, shuffle=shuffle, slideshow=slideshow)
+    return ImageViewer(application, config, shuffle=shuffle, slideshow=slideshow, recursive=recursive)
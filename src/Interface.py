@@ -5,15 +5,21 @@ import gi
 gi.require_version('Gtk', '3.0')
 
 import os
+import sys
+from collections import deque
+
 from gi.repository import Gtk
 from gi.repository import GObject
 from gi.repository import Gdk
 from gi.repository import GLib
+from gi.repository import GdkPixbuf
 
 from .Places import UI_FOLDER
 from .Places import CSS_FOLDER
 
+from .ImageViewer import DEBUG_STATS
 from .ImageViewer import INOTIFY
+from .tiles import TiledRenderer
 
 DEFAULT_SIZE = (300, 300)
 ZOOM_FACTOR = 0.9
@@ -25,9 +31,19 @@ MOUSE_DELTA_INCREMENT = 1
 MAX_ZOOM = 5.0
 MIN_ZOOM = 0.02
 MIN_CONTENT_SIZE = 10
+FIT_MARGIN = 5
 
 MOVE_IMAGE_INCREMENT = 20
 
+ZOOM_REFINE_DELAY = 150  # ms without zoom events before the high quality rescale
+ZOOM_FRAME_TIMES = 120  # preview render times kept for a zoom burst
+
+TILED_MIN_PIXELS = 16 * 1024 * 1024  # Render bigger zoomed images in tiles
+
+ANIMATION_MAX_TICK = 0.25  # seconds, longer gaps between frames do not advance the animation
+
+PROGRESSIVE_REDRAW_INTERVAL = 100000  # microseconds between partial redraws
+
 SCROLL_ADJUST_HORIZONTAL = 0
 SCROLL_ADJUST_VERTICAL = 1
 
@@ -158,6 +174,7 @@ class Interface:
 
         self.main_window = self.builder.get_object('MainWindow')
         self.image_widget = self.builder.get_object('Image')
+        self.tiled_renderer = TiledRenderer()
         # self.image_widget.set_name('image-checked')
         # self.main_window.add_events(Gdk.EventMask.STRUCTURE_MASK)
         self.main_window.set_size_request(*DEFAULT_SIZE)
@@ -190,6 +207,9 @@ class Interface:
         self.scroll_zoom_number = 0
         self.scroll_position_x = 0
         self.scroll_position_y = 0
+        self.zoom_preview_idle = None
+        self.zoom_refine_timeout = None
+        self.zoom_frame_times = deque(maxlen=ZOOM_FRAME_TIMES)
         adjust_h = scrolled_window.get_hadjustment()
         adjust_h.connect('changed', self.scrollRelativeToMouse, SCROLL_ADJUST_HORIZONTAL)
         adjust_v = scrolled_window.get_vadjustment()
@@ -203,8 +223,12 @@ class Interface:
         self.fade_timeout = GObject.timeout_add(500, self.checkMouseFade)
         # Timeouts
         self.open_image_timeout = None
-        self.inotify_timeout = None
-        self.animation_update_timeout = None
+        self.inotify_watch = None
+        self.animation_tick_id = None
+        self.animation_time = 0.0
+        self.animation_last_tick = None
+        self.animation_pixbuf = None
+        self.window_hidden = False
         self.toggle_timeout = None
 
         # Connect signals
@@ -360,6 +384,7 @@ class Interface:
 
     def changeImageBGCheckPattern(self):
         self.image_widget.set_name('image-checked')
+        self.tiled_renderer.getWidget().set_name('image-checked')
 
     def changeImageBgAsMain(self):
         col = self.config.getInterfaceBGColour()
@@ -371,6 +396,7 @@ class Interface:
     def changeImageBG(self, colour):
         self.changeClassBGColour('image', colour)
         self.image_widget.set_name('image')
+        self.tiled_renderer.getWidget().set_name('image')
 
     def changeClassBGColour(self, class_name, colour):
         # colour should be Gdk.RGBA
@@ -393,9 +419,11 @@ class Interface:
     ###################
     def start(self, image, init_slideshow: bool = False):
         if INOTIFY:
-            self.inotify_timeout = GObject.timeout_add(500, self.checkInotify)
+            # Wake up only when there are events to read
+            self.inotify_watch = GLib.io_add_watch(self.image_viewer.getInotifyFd(), GLib.PRIORITY_DEFAULT,
+                                                   GLib.IOCondition.IN, self.onInotifyEvents)
         else:
-            self.inotify_timeout = None
+            self.inotify_watch = None
         # Wait for the widget to be completely drawn
         GObject.timeout_add(200, self.openImage, image)
         if init_slideshow:
@@ -408,12 +436,14 @@ class Interface:
 
     def close(self, *args):
         self.stopAnimationUpdate()
+        self.stopProgressiveLoad()
+        self.stopZoomRender()
         if self.fade_timeout is not None:
             GObject.source_remove(self.fade_timeout)
             self.fade_timeout = None
-        if self.inotify_timeout is not None:
-            GObject.source_remove(self.inotify_timeout)
-            self.inotify_timeout = None
+        if self.inotify_watch is not None:
+            GLib.source_remove(self.inotify_watch)
+            self.inotify_watch = None
         # Close the viewer
         self.image_viewer.close()
 
@@ -426,12 +456,8 @@ class Interface:
     #############
     ## Inotify ##
     #############
-    def checkInotify(self):
-        notifier = self.image_viewer.pyinotify_notifier
-        notifier.process_events()
-        while notifier.check_events():
-            notifier.read_events()
-            notifier.process_events()
+    def onInotifyEvents(self, fd, condition):
+        self.image_viewer.processInotifyEvents()
         return True
 
     #########################
@@ -442,6 +468,13 @@ class Interface:
             if event.changed_mask == Gdk.WindowState.FULLSCREEN:
                 # wait for the window changes to have taken effect
                 GObject.timeout_add(100, self.fitImageToWindow)
+            hidden = bool(event.new_window_state & (Gdk.WindowState.ICONIFIED | Gdk.WindowState.WITHDRAWN))
+            if hidden != self.window_hidden:
+                self.window_hidden = hidden
+                if hidden:
+                    self.pauseAnimation()
+                else:
+                    self.resumeAnimation()
         return False
 
     def enableSlideshow(self):
@@ -494,12 +527,17 @@ class Interface:
     ################
     def openImage(self, image):
         self.stopAnimationUpdate()
+        self.stopProgressiveLoad()
+        self.stopZoomRender()
+        if self.image is not None and self.image is not image:
+            self.image.release()
         # Set image
         self.image = image
         # Check
         if self.image is None:
             # show error widget
             self.main_window.set_title('Image viewer - No image')
+            self.showTiled(False)
             self.image_widget.show()
             return True
         self.imageQuickSetup()
@@ -523,7 +561,9 @@ class Interface:
 
     def openImageReal(self):
         self.image_widget.show()
-        if self.image.isStatic():
+        if self.image.isLoading():
+            self.openProgressiveImage()
+        elif self.image.isStatic():
             self.openStaticImage()
         elif self.image.isAnimation():
             self.openAnimation()
@@ -537,14 +577,70 @@ class Interface:
 
     def setErrorImage(self):
         pixbuf = Gtk.IconTheme.get_default().load_icon(MISSING_IMAGE_ICON, 64, 0)
-        self.image_widget.set_from_pixbuf(pixbuf)
+        self.setPixbuf(pixbuf)
         self.setEmptyInfo()
 
+    def setPixbuf(self, pixbuf):
+        self.showTiled(False)
+        self.image_widget.set_from_pixbuf(pixbuf)
+
+    def showTiled(self, tiled):
+        # Swap the widget in the viewport
+        viewport = self.builder.get_object('viewport')
+        current = viewport.get_child()
+        if tiled:
+            widget = self.tiled_renderer.getWidget()
+        else:
+            widget = self.image_widget
+            self.tiled_renderer.clear()
+        if current is not widget:
+            viewport.remove(current)
+            viewport.add(widget)
+            widget.show()
+
+    def getDisplayWidget(self):
+        viewport = self.builder.get_object('viewport')
+        return viewport.get_child()
+
     def openStaticImage(self):
-        self.image_widget.set_from_pixbuf(self.image.getPixbuf())
+        self.setPixbuf(self.image.getPixbuf())
 
     def openAnimation(self):
-        self.updateAnimation()
+        self.startAnimation()
+
+    #######################
+    ## Progressive image ##
+    #######################
+    def openProgressiveImage(self):
+        self.progressive_last_update = 0
+        self.image.loadProgressive(self.onProgressiveUpdate, self.onProgressiveDone)
+
+    def onProgressiveUpdate(self, pixbuf):
+        # Paint the partially decoded image, at most every PROGRESSIVE_REDRAW_INTERVAL
+        now = GLib.get_monotonic_time()
+        if pixbuf is None or now - self.progressive_last_update < PROGRESSIVE_REDRAW_INTERVAL:
+            return
+        self.progressive_last_update = now
+        width, height = self.getFitSize()
+        factor = min(width / pixbuf.get_width(), height / pixbuf.get_height(), 1.0)
+        if factor > 0:
+            width = max(int(pixbuf.get_width() * factor), 1)
+            height = max(int(pixbuf.get_height() * factor), 1)
+            self.setPixbuf(pixbuf.scale_simple(width, height, GdkPixbuf.InterpType.NEAREST))
+
+    def onProgressiveDone(self, image):
+        if image is not self.image:
+            return
+        if self.image.isStatic():
+            self.openStaticImage()
+            self.fitImageToWindow()
+            self.fillInfo()
+        else:
+            self.setErrorImage()
+
+    def stopProgressiveLoad(self):
+        if self.image is not None and self.image.isLoading():
+            self.image.cancelLoad()
 
     @imageIsNotNone
     def nextImage(self, **kwargs):
@@ -557,20 +653,48 @@ class Interface:
     ####################
     ## Load Animation ##
     ####################
+    # The animation follows the frame clock of the image widget:
+    # the frame shown is computed from the playback time at each tick,
+    # late frames are skipped and no tick runs while the window is hidden
+    def startAnimation(self):
+        self.stopAnimationUpdate()
+        self.animation_time = 0.0
+        self.animation_pixbuf = None
+        self.updateAnimation()
+        self.resumeAnimation()
+
     def updateAnimation(self):
         # Get pixbuf
-        aiter, pixbuf = self.image.getAnimationPixbuf()
-        # Set image
-        self.image_widget.set_from_pixbuf(pixbuf)
-        # Wait for the next update
-        delay = aiter.get_delay_time()
-        self.animation_update_timeout = GObject.timeout_add(delay, self.updateAnimation)
-        return False
+        _, pixbuf = self.image.getAnimationPixbuf(self.animation_time)
+        # Set image, if the frame changed
+        if pixbuf is not self.animation_pixbuf:
+            self.animation_pixbuf = pixbuf
+            self.setPixbuf(pixbuf)
+
+    def onAnimationTick(self, widget, frame_clock):
+        now = frame_clock.get_frame_time() / 1000000
+        if self.animation_last_tick is not None:
+            self.animation_time += min(now - self.animation_last_tick, ANIMATION_MAX_TICK)
+        self.animation_last_tick = now
+        self.updateAnimation()
+        return GLib.SOURCE_CONTINUE
+
+    def pauseAnimation(self):
+        if self.animation_tick_id is not None:
+            self.image_widget.remove_tick_callback(self.animation_tick_id)
+            self.animation_tick_id = None
+
+    def resumeAnimation(self):
+        if self.animation_tick_id is not None or self.window_hidden:
+            return
+        if self.image is None or not self.image.isAnimation():
+            return
+        self.animation_last_tick = None
+        self.animation_tick_id = self.image_widget.add_tick_callback(self.onAnimationTick)
 
     def stopAnimationUpdate(self):
-        if self.animation_update_timeout is not None:
-            GObject.source_remove(self.animation_update_timeout)
-            self.animation_update_timeout = None
+        self.pauseAnimation()
+        self.animation_pixbuf = None
 
     ########################
     ## Keyboard shortcuts ##
@@ -725,7 +849,7 @@ class Interface:
         if zoomed and zoom_in is not None:
             self.scroll_zoom_number += 1
             # Get mouse position relative to img
-            x_img, y_img = self.image_widget.translate_coordinates(widget, 0, 0)
+            x_img, y_img = self.getDisplayWidget().translate_coordinates(widget, 0, 0)
             x_m, y_m = scroll_event.get_coords()
             start_x = x_m - x_img
             start_y = y_m - y_img
@@ -746,18 +870,23 @@ class Interface:
         self.user_set_zoom = False
         self.fitImageToWindow()
 
-    @imageIsResizable
-    def fitImageToWindow(self, *args):
+    def getFitSize(self):
+        # Largest image size that fits in the window
         scrolled_window = self.builder.get_object('ScrolledWindow')
         adjust = scrolled_window.get_hadjustment()
         width = adjust.get_page_size()
         adjust = scrolled_window.get_vadjustment()
         height = adjust.get_page_size()
+        return width - FIT_MARGIN, height - FIT_MARGIN
+
+    @imageIsResizable
+    def fitImageToWindow(self, *args):
+        width, height = self.getFitSize()
         img_width, img_height = self.image.getSize()
         if not self.user_set_zoom:
-            if img_width > width - 5 or img_height > height - 5:
+            if img_width > width or img_height > height:
                 # zoom to window size
-                self.zoom((width - 5, height - 5))
+                self.zoom((width, height))
             else:
                 # zoom to image size
                 self.zoom((img_width, img_height))
@@ -766,13 +895,13 @@ class Interface:
     def zoomIn(self):
         self.user_set_zoom = True
         factor = self.current_factor / ZOOM_FACTOR
-        return self.zoomImage(factor)
+        return self.zoomImage(factor, quick=True)
 
     @imageIsResizable
     def zoomOut(self):
         self.user_set_zoom = True
         factor = self.current_factor * ZOOM_FACTOR
-        return self.zoomImage(factor)
+        return self.zoomImage(factor, quick=True)
 
     @imageIsResizable
     def zoom(self, size):
@@ -785,27 +914,89 @@ class Interface:
         return self.zoomImage(factor)
 
     @imageIsResizable
-    def zoomImage(self, factor):
+    def zoomImage(self, factor, quick=False):
+        # quick: show a low quality preview now and refine the image
+        # once the zoom events stop
         factor = max(min(factor, MAX_ZOOM), MIN_ZOOM)
         if self.current_factor is not None and factor == self.current_factor:
             # No need to update the image
             return False
         self.current_factor = factor
-        img_width, img_height = self.image.getSize()
-        width = max(int(img_width * self.current_factor), 1)
-        height = max(int(img_height * self.current_factor), 1)
-        zoom_pix = self.image.scale(width, height)
+        width, height = self.getZoomSize()
         self.fillZoomInfo()
-        if self.image.isStatic():
-            self.image_widget.set_from_pixbuf(zoom_pix)
+        if self.image.isStatic() and quick:
+            # Coalesce the events received before the next idle
+            if self.zoom_preview_idle is None:
+                self.zoom_preview_idle = GObject.idle_add(self.renderZoomPreview, priority=GLib.PRIORITY_HIGH_IDLE)
+            if self.zoom_refine_timeout is not None:
+                GObject.source_remove(self.zoom_refine_timeout)
+            self.zoom_refine_timeout = GObject.timeout_add(ZOOM_REFINE_DELAY, self.refineZoom)
+        elif self.image.isStatic():
+            self.stopZoomRender()
+            self.renderZoom(GdkPixbuf.InterpType.BILINEAR)
         elif self.image.isAnimation():
-            self.stopAnimationUpdate()
+            self.image.scale(width, height)
+            # Show the current frame at the new size
             self.updateAnimation()
         else:
             self.setErrorImage()
         # Image updated
         return True
 
+    def getZoomSize(self):
+        img_width, img_height = self.image.getSize()
+        width = max(int(img_width * self.current_factor), 1)
+        height = max(int(img_height * self.current_factor), 1)
+        return width, height
+
+    @imageIsResizable
+    def renderZoom(self, interp):
+        width, height = self.getZoomSize()
+        if width * height > TILED_MIN_PIXELS:
+            # Only scale the visible part of the image
+            pixbuf = self.image.getSourcePixbuf(width, height)
+            self.tiled_renderer.setSource(pixbuf, width, height)
+            self.showTiled(True)
+        else:
+            zoom_pix = self.image.scale(width, height, interp)
+            self.setPixbuf(zoom_pix)
+
+    def renderZoomPreview(self):
+        self.zoom_preview_idle = None
+        start = GLib.get_monotonic_time()
+        self.renderZoom(GdkPixbuf.InterpType.NEAREST)
+        self.zoom_frame_times.append(GLib.get_monotonic_time() - start)
+        return False
+
+    def refineZoom(self):
+        # End of a zoom burst
+        self.zoom_refine_timeout = None
+        self.renderZoom(GdkPixbuf.InterpType.BILINEAR)
+        if DEBUG_STATS:
+            self.printZoomFrameTimes()
+        self.zoom_frame_times.clear()
+        return False
+
+    def stopZoomRender(self):
+        if self.zoom_preview_idle is not None:
+            GObject.source_remove(self.zoom_preview_idle)
+            self.zoom_preview_idle = None
+        if self.zoom_refine_timeout is not None:
+            GObject.source_remove(self.zoom_refine_timeout)
+            self.zoom_refine_timeout = None
+
+    def getZoomFrameTimes(self):
+        # Render time (microseconds) of the previews of the current zoom burst
+        return list(self.zoom_frame_times)
+
+    def printZoomFrameTimes(self):
+        times = sorted(self.zoom_frame_times)
+        if len(times) == 0:
+            return
+        print('zoom: %d previews, median %.1f ms, 95%% %.1f ms, max %.1f ms'
+              % (len(times), times[len(times) // 2] / 1000, times[int(len(times) * 0.95)] / 1000,
+                 times[-1] / 1000), file=sys.stderr)
+
     ##############
     ## Info bar ##
     ##############
@@ -815,12 +1006,23 @@ class Interface:
         # Fill image size / zoom
         self.fillZoomInfo()
 
+    @imageIsNotNone
     def fillNavigatorInfo(self):
         label = self.builder.get_object('InfoNavigator')
+        if self.image_viewer.isListingFolder():
+            label.set_text('…')
+            return
         tot = self.image_viewer.getTotImages()
-        label_str = str(self.image.getPosition() + 1) + '/' + str(tot)
+        label_str = str(self.image_viewer.getCurrentPosition() + 1) + '/' + str(tot)
         label.set_text(label_str)
 
+    def showNavigationTarget(self, path, position):
+        # Shown while the image at path waits to be decoded
+        title = os.path.basename(os.path.dirname(path)) + '/' + os.path.basename(path)
+        self.main_window.set_title(title)
+        label = self.builder.get_object('InfoNavigator')
+        label.set_text(str(position + 1) + '/' + str(self.image_viewer.getTotImages()))
+
     def fillZoomInfo(self):
         label = self.builder.get_object('InfoSize')
         width, height = self.image.getSize()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import threading
+
+from PIL import Image
+
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+from .animationfile import composeFrame
+from .animationfile import getFrameDelay
+from .pixbufconvert import convertPilImageToGdkPixbuf
+
+FRAME_STORE_MAX_BYTES = 128 * 1024 * 1024
+
+
+## Animation frame store
+# Ring of the scaled frames of an animation, indexed by frame number.
+# Each frame is scaled once per output size, a size change empties the ring.
+class AnimationFrameStore:
+
+    def __init__(self, frame_count, max_bytes=FRAME_STORE_MAX_BYTES):
+        self.frame_count = frame_count
+        self.max_bytes = max_bytes
+        self.size = None
+        self.slots = []
+
+    def getFrame(self, index, width, height, get_source):
+        # get_source() returns the unscaled pixbuf of the frame
+        if self.size != (width, height):
+            self.resize(width, height)
+        slot = index % len(self.slots)
+        cached_index, pixbuf = self.slots[slot]
+        if cached_index != index:
+            pixbuf = get_source().scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+            self.slots[slot] = (index, pixbuf)
+        return pixbuf
+
+    def resize(self, width, height):
+        self.size = (width, height)
+        frame_bytes = 4 * width * height
+        capacity = max(min(self.frame_count, self.max_bytes // frame_bytes), 1)
+        self.slots = [(-1, None)] * capacity
+
+
+## GdkPixbuf animation player
+# Drive a GdkPixbufAnimationIter with our own clock, one frame at a time,
+# so that the number of the frame shown is always known.
+class PixbufAnimationPlayer:
+
+    def __init__(self, animation, frame_count):
+        self.animation = animation
+        self.frame_count = frame_count
+        self.start_time = None
+        # Animation time (ms) when the current frame started
+        self.frame_time = 0
+        self.frame_index = 0
+        self.iter = animation.get_iter(self._getTimeVal(0))
+
+    def _getTimeVal(self, milliseconds):
+        time_val = GLib.TimeVal()
+        time_val.tv_sec = milliseconds // 1000
+        time_val.tv_usec = (milliseconds % 1000) * 1000
+        return time_val
+
+    def advance(self, time=None):
+        # time in seconds, on any clock
+        if time is None:
+            time = GLib.get_current_time()
+        if self.start_time is None:
+            self.start_time = time
+            return True
+        elapsed = int((time - self.start_time) * 1000)
+        changed = False
+        delay = self.iter.get_delay_time()
+        while delay >= 0 and self.frame_time + delay <= elapsed:
+            self.frame_time += delay
+            self.iter.advance(self._getTimeVal(self.frame_time))
+            self.frame_index = (self.frame_index + 1) % self.frame_count
+            changed = True
+            delay = self.iter.get_delay_time()
+        return changed
+
+    def getFrameIndex(self):
+        return self.frame_index
+
+    def get_pixbuf(self):
+        return self.iter.get_pixbuf()
+
+    def get_delay_time(self):
+        return self.iter.get_delay_time()
+
+
+## Streaming frames
+# Decode the frames of a PIL animation on a worker thread, keeping only
+# frame_budget pixbufs ahead of the playback position.
+# Frames are numbered in absolute terms (loop * frame_count + index).
+# Pillow composes the frames itself, so no canvas is kept: a seek goes
+# straight to the frame of the target. Seeking back still costs a
+# decode from frame 0 inside Pillow (in C, frames are not converted).
+class StreamingFrames:
+
+    def __init__(self, path, frame_budget):
+        self.path = path
+        self.frame_budget = max(frame_budget, 1)
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+        # Filled during the first pass
+        self.delays = []
+        self.frame_count = None
+        # Absolute frame -> pixbuf
+        self.pixbufs = {}
+        # Playback position and seek requests
+        self.position = 0
+        self.restart = None
+        # Decoder state
+        self.img = Image.open(path)
+        self.index = 0
+        self.decoded = 0
+        # Show the first frame as soon as possible
+        self.decodeNext()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='iw-animation', daemon=True)
+            self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while (not self.stopped and self.restart is None
+                       and self.decoded >= self.position + self.frame_budget):
+                    self.condition.wait()
+                if self.stopped:
+                    break
+                if self.restart is not None:
+                    self.seekDecoder(self.restart)
+                    self.restart = None
+            if not self.decodeNext():
+                break
+        self.img.close()
+
+    def decodeNext(self):
+        # Decode the next frame, False if there are none
+        self.storeFrame(getFrameDelay(self.img))
+        try:
+            self.img.seek(self.img.tell() + 1)
+        except EOFError:
+            if not self.endOfPass():
+                return False
+        return True
+
+    def storeFrame(self, duration):
+        with self.condition:
+            keep = self.decoded >= self.position
+        # Frames behind the playback position are not converted
+        pixbuf = convertPilImageToGdkPixbuf(composeFrame(self.img)[0]) if keep else None
+        with self.condition:
+            if self.index == len(self.delays):
+                # First time this frame is decoded
+                self.delays.append(duration)
+            if pixbuf is not None:
+                self.pixbufs[self.decoded] = pixbuf
+            self.decoded += 1
+            self.index += 1
+            self.condition.notify_all()
+
+    def endOfPass(self):
+        with self.condition:
+            if self.frame_count is None:
+                self.frame_count = self.index
+            if self.frame_count == 0:
+                return False
+        # Loop: restart from the first frame
+        self.img.seek(0)
+        self.index = 0
+        return True
+
+    def seekDecoder(self, frame):
+        # NOTE: called with the lock held
+        index = frame % self.frame_count if self.frame_count is not None else frame
+        self.img.seek(index)
+        self.index = index
+        self.decoded = frame
+
+    def setPosition(self, frame):
+        # Drop the frames before the playback position, seek back if needed
+        with self.condition:
+            self.position = frame
+            for key in [key for key in self.pixbufs if key < frame]:
+                del self.pixbufs[key]
+            if frame < self.decoded and frame not in self.pixbufs:
+                self.restart = frame
+            self.condition.notify_all()
+
+    def getPixbuf(self, frame):
+        with self.condition:
+            return self.pixbufs.get(frame)
+
+    def getTimeline(self, start):
+        # Delays of the frames from start on, and the frame count if known
+        with self.condition:
+            return self.delays[start:], self.frame_count
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import functools
+import os
+import struct
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+WEBP_ANIMATION_FLAG = 0x02  # In the flags of the VP8X chunk
+ANIMATION_CHECK_CACHE = 4096  # Files whose check is kept, by path, mtime and size
+MIN_FRAME_DELAY = 10  # ms, shorter frame delays are replaced by DEFAULT_FRAME_DELAY
+DEFAULT_FRAME_DELAY = 100  # ms
+
+
+## Animation check
+# PNG and WebP files are animated only if their header says so
+# (acTL chunk before the image data, VP8X animation flag): a few bytes
+# are read instead of opening the file with Pillow, once per file version.
+def isAnimatedFile(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return _isAnimatedFile(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=ANIMATION_CHECK_CACHE)
+def _isAnimatedFile(path, mtime, size):
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(12)
+            if header.startswith(PNG_SIGNATURE):
+                file.seek(len(PNG_SIGNATURE))
+                return _isAnimatedPNG(file)
+            if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+                chunk = file.read(9)
+                return chunk[:4] == b'VP8X' and len(chunk) == 9 and bool(chunk[8] & WEBP_ANIMATION_FLAG)
+    except OSError:
+        pass
+    return False
+
+
+def _isAnimatedPNG(file):
+    # APNG: an acTL chunk with more than one frame before the first IDAT
+    while True:
+        chunk = file.read(8)
+        if len(chunk) < 8:
+            return False
+        length, kind = struct.unpack('>I4s', chunk)
+        if kind == b'acTL':
+            data = file.read(4)
+            return len(data) == 4 and struct.unpack('>I', data)[0] > 1
+        if kind in (b'IDAT', b'IEND'):
+            return False
+        # Skip the data and the CRC
+        file.seek(length + 4, os.SEEK_CUR)
+
+
+## Animation frames
+# Frames of an animated file read with Pillow.
+# Pillow composes the frames itself (GIF disposal and transparency,
+# APNG and WebP blending): each frame only needs a conversion.
+
+
+def getFrameDelay(img):
+    # Delay (ms) of the current frame of img. Like browsers, frames of
+    # 10 ms or less (often 0, e.g. all frames of some GIFs) last 100 ms.
+    delay = img.info.get('duration') or 0
+    return DEFAULT_FRAME_DELAY if delay <= MIN_FRAME_DELAY else delay
+
+
+def composeFrame(img):
+    # Current frame of img as RGBA, and its delay (ms)
+    return img.convert('RGBA'), getFrameDelay(img)
+
+
+def iterFrames(img):
+    # (frame, delay) of each frame of img from the current one
+    while True:
+        yield composeFrame(img)
+        try:
+            img.seek(img.tell() + 1)
+        except EOFError:
+            return
@@ -35,7 +35,8 @@ class ImageViewerApplication(Gtk.Application):
         iw = ImageViewer.new(self,
                              config_folder,
                              shuffle=self.command_line_args.shuffle,
-                             slideshow=self.command_line_args.slideshow)
+                             slideshow=self.command_line_args.slideshow,
+                             recursive=self.command_line_args.recursive)
         iw.start(address)
         return iw
 
@@ -16,6 +16,12 @@ CONFIG_BG_COLOUR = 'BG_colour'
 CONFIG_IMAGE_BG_TYPE = 'BG_image_type'
 CONFIG_IMAGE_BG_COLOUR = 'BG_image_colour'
 CONFIG_SLIDESHOW_SECONDS = 'Slideshow_seconds'
+CONFIG_PREFETCH_NEXT = 'Prefetch_next'
+CONFIG_PREFETCH_PREV = 'Prefetch_prev'
+CONFIG_CACHE_SIZE_MB = 'Cache_size_mb'
+CONFIG_ANIMATION_FRAME_BUDGET = 'Animation_frame_budget'
+CONFIG_FOLDER_INDEX = 'Folder_index'
+CONFIG_SORT_ORDER = 'Sort_order'
 
 IMAGE_BG_TYPE_COLOUR = 'colour'
 IMAGE_BG_TYPE_PATTERN = 'pattern'
@@ -28,6 +34,12 @@ DEFAULT_CONFIG = {CONFIG_WINDOW_WIDTH: '100',
                   CONFIG_IMAGE_BG_TYPE: IMAGE_BG_TYPE_PATTERN,
                   CONFIG_IMAGE_BG_COLOUR: 'rgb(0,0,0)',
                   CONFIG_SLIDESHOW_SECONDS: '5',
+                  CONFIG_PREFETCH_NEXT: '2',
+                  CONFIG_PREFETCH_PREV: '1',
+                  CONFIG_CACHE_SIZE_MB: '512',
+                  CONFIG_ANIMATION_FRAME_BUDGET: '64',
+                  CONFIG_FOLDER_INDEX: 'True',
+                  CONFIG_SORT_ORDER: 'name',
                   }
 
 
@@ -112,6 +124,27 @@ class IWConfig:
     def getSlideshowSeconds(self) -> int:
         return self._getConfigInt(CONFIG_SLIDESHOW_SECONDS)
 
+    def getPrefetchWindow(self):
+        next_count = max(self._getConfigInt(CONFIG_PREFETCH_NEXT), 0)
+        prev_count = max(self._getConfigInt(CONFIG_PREFETCH_PREV), 0)
+        return next_count, prev_count
+
+    def getCacheSizeBytes(self):
+        return max(self._getConfigInt(CONFIG_CACHE_SIZE_MB), 0) * 1024 * 1024
+
+    def getAnimationFrameBudget(self):
+        return max(self._getConfigInt(CONFIG_ANIMATION_FRAME_BUDGET), 0)
+
+    def useFolderIndex(self):
+        return self._getConfigBool(CONFIG_FOLDER_INDEX)
+
+    def getSortOrder(self):
+        # One of sorting.SORT_ORDERS
+        return self._getConfig(CONFIG_SORT_ORDER).lower()
+
+    def getConfigFolder(self):
+        return os.path.dirname(self.config_file)
+
 
 def readConfig(config_folder):
     if not os.path.exists(config_folder):
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import threading
+
+INDEX_FILE = 'folder_index.sqlite'
+NAMES_SEPARATOR = '\0'  # Not allowed in file names
+LOCK_TIMEOUT = 1.0  # Seconds to wait for another instance writing the index
+SCHEMA_VERSION = 2  # Older indexes are dropped, they are only a cache
+FOLDERS_MAX = 10000  # Listings kept, the oldest stored are pruned
+IMAGES_MAX = 200000  # Image sizes kept, the oldest stored are pruned
+PRUNE_INTERVAL = 1000  # Rows stored between two prunings
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    names TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL
+);
+'''
+
+
+## Persistent folder index
+# Sorted listings of the folders opened and sizes of the images seen,
+# kept on disk between runs.
+# A listing is valid while the folder mtime (ns) is unchanged and it was
+# stored with the same tag (sort order, natural key and image extensions),
+# an image size while the file mtime and size are unchanged.
+# Rows are pruned by age of storage (INSERT OR REPLACE renews the rowid).
+# The index is only a cache: any database error is a miss.
+class FolderIndex:
+
+    def __init__(self, path, tag=''):
+        self.tag = tag
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS folders')
+                self.connection.execute('DROP TABLE IF EXISTS images')
+                self.connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+            self.connection.executescript(SCHEMA)
+        self.prune()
+
+    def _fetch(self, query, params):
+        try:
+            with self.lock:
+                return self.connection.execute(query, params).fetchone()
+        except sqlite3.Error:
+            return None
+
+    def _store(self, query, params):
+        try:
+            with self.lock, self.connection:
+                self.connection.execute(query, params)
+                self.stored += 1
+                prune = self.stored % PRUNE_INTERVAL == 0
+        except sqlite3.Error:
+            return
+        if prune:
+            self.prune()
+
+    def prune(self):
+        # Keep the FOLDERS_MAX listings and IMAGES_MAX sizes stored last
+        try:
+            with self.lock, self.connection:
+                for table, limit in (('folders', FOLDERS_MAX), ('images', IMAGES_MAX)):
+                    self.connection.execute('DELETE FROM %s WHERE rowid <= (SELECT MAX(rowid) FROM %s) - ?'
+                                            % (table, table), (limit,))
+        except sqlite3.Error:
+            pass
+
+    def getListing(self, folder, mtime):
+        # Sorted names of folder if still valid, None otherwise
+        row = self._fetch('SELECT mtime, tag, names FROM folders WHERE path = ?', (folder,))
+        if row is None or row[0] != mtime or row[1] != self.tag:
+            return None
+        return row[2].split(NAMES_SEPARATOR) if row[2] else []
+
+    def putListing(self, folder, mtime, names):
+        self._store('INSERT OR REPLACE INTO folders (path, mtime, tag, names) VALUES (?, ?, ?, ?)',
+                    (folder, mtime, self.tag, NAMES_SEPARATOR.join(names)))
+
+    def removeListing(self, folder):
+        self._store('DELETE FROM folders WHERE path = ?', (folder,))
+
+    def getImageSize(self, path, stat):
+        row = self._fetch('SELECT mtime, size, width, height FROM images WHERE path = ?', (path,))
+        if row is None or row[0] != stat.st_mtime_ns or row[1] != stat.st_size:
+            return None
+        return row[2], row[3]
+
+    def putImageSize(self, path, stat, width, height):
+        self._store('INSERT OR REPLACE INTO images (path, mtime, size, width, height) VALUES (?, ?, ?, ?, ?)',
+                    (path, stat.st_mtime_ns, stat.st_size, width, height))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def openFolderIndex(config_folder, tag=''):
+    # None if the index cannot be used.
+    # tag: how the listings are made, a listing stored with another tag is ignored
+    try:
+        return FolderIndex(os.path.join(config_folder, INDEX_FILE), tag)
+    except sqlite3.Error:
+        return None
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import bisect
+import random
+
+from .sorting import getNaturalKey
+
+## Folder model
+# Navigation order of the images of a folder.
+# Positions are found through a name -> position map, built on the first
+# lookup. When shuffled the map is patched on each change: a new name
+# takes a random slot whose name moves to the end, a removed name is
+# replaced by the last one. In sorted mode a change moves the names
+# after it, the map is rebuilt once per batch (see update) and the names
+# are bisected on their sort keys in between.
+class FolderModel:
+
+    def __init__(self, names=(), shuffled=False, is_sorted=False, get_key=getNaturalKey, keys=None):
+        # is_sorted: names are already in sorted order (e.g. from FolderIndex)
+        # get_key(name): sort key, keys: name -> key already computed
+        self.get_key = get_key
+        self.key_cache = keys if keys is not None else {}
+        self.shuffled = shuffled
+        if shuffled or is_sorted:
+            self.names = list(names)
+        else:
+            self.names = sorted(names, key=self.getSortKey)
+        self.index = None
+        # Sorted mode: names moved since the map was built
+        self.stale = False
+
+    def getSortKey(self, name):
+        key = self.key_cache.get(name)
+        if key is None:
+            key = self.get_key(name)
+            self.key_cache[name] = key
+        return key
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, position):
+        return self.names[position]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return self.getPosition(name) != -1
+
+    def _getIndex(self):
+        if self.index is None:
+            self.index = {name: position for position, name in enumerate(self.names)}
+            self.stale = False
+        return self.index
+
+    def _bisect(self, name):
+        return bisect.bisect_left(self.names, self.getSortKey(name), key=self.getSortKey)
+
+    def _setStale(self):
+        self.index = None
+        self.stale = True
+
+    def getPosition(self, name):
+        if not self.stale:
+            return self._getIndex().get(name, -1)
+        position = self._bisect(name)
+        if position < len(self.names) and self.names[position] == name:
+            return position
+        return -1
+
+    def getSorted(self):
+        # Names in sorted order, whatever the navigation order
+        if self.shuffled:
+            return sorted(self.names, key=self.getSortKey)
+        return list(self.names)
+
+    def insert(self, name):
+        # Add name in order (at a random position when shuffled),
+        # return its position
+        position = self.getPosition(name)
+        if position != -1:
+            return position
+        if not self.shuffled:
+            position = self._bisect(name)
+            self.names.insert(position, name)
+            self._setStale()
+            return position
+        index = self._getIndex()
+        position = random.randint(0, len(self.names))
+        if position < len(self.names):
+            moved = self.names[position]
+            self.names[position] = name
+            index[moved] = len(self.names)
+            self.names.append(moved)
+        else:
+            self.names.append(name)
+        index[name] = position
+        return position
+
+    def remove(self, name):
+        position = self.getPosition(name)
+        if position == -1:
+            return False
+        self.key_cache.pop(name, None)
+        if not self.shuffled:
+            del self.names[position]
+            self._setStale()
+            return True
+        index = self._getIndex()
+        del index[name]
+        last = self.names.pop()
+        if position < len(self.names):
+            self.names[position] = last
+            index[last] = position
+        return True
+
+    def update(self, added=(), removed=()):
+        # Apply a batch of changes, the map is rebuilt at most once.
+        # Return True if the names changed.
+        removed = set(name for name in removed if name in self)
+        added = set(name for name in added if name not in self) - removed
+        if len(removed) == 0 and len(added) == 0:
+            return False
+        if self.shuffled:
+            for name in removed:
+                self.remove(name)
+            for name in added:
+                self.insert(name)
+            return True
+        for name in removed:
+            self.key_cache.pop(name, None)
+        names = [name for name in self.names if name not in removed] if len(removed) > 0 else self.names
+        if len(added) > 0:
+            # Few additions are bisected in, many are merged by a sort
+            # (timsort merges the sorted runs in linear time)
+            if len(added) * 16 < len(names):
+                for name in added:
+                    names.insert(bisect.bisect_left(names, self.getSortKey(name), key=self.getSortKey), name)
+            else:
+                names.extend(added)
+                names.sort(key=self.getSortKey)
+        self.names = names
+        self.index = None
+        self.stale = False
+        return True
+
+    def setFirst(self, name):
+        # Shuffle mode: swap name with the first element
+        position = self.getPosition(name)
+        if position <= 0:
+            return
+        index = self._getIndex()
+        first = self.names[0]
+        self.names[0], self.names[position] = name, first
+        index[name], index[first] = 0, position
+
+    def copy(self):
+        model = FolderModel(self.names, shuffled=self.shuffled, is_sorted=True,
+                            get_key=self.get_key, keys=dict(self.key_cache))
+        return model
+
+    def shuffle(self, first=None):
+        # Random order, with first (if present) as first element
+        random.shuffle(self.names)
+        self.shuffled = True
+        self.index = None
+        self.stale = False
+        if first is not None:
+            self.setFirst(first)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .foldermodel import FolderModel
+
+MAX_CACHED_LISTINGS = 256  # Image listings kept, counts are kept for every folder
+
+NEXT = 1
+PREV = -1
+
+
+## Folder tree cache
+# Listings of the folders met while navigating across folders.
+# Every entry is validated by the mtime of the directory, which changes
+# when an entry is added, removed or renamed, so a folder is listed
+# again only if it changed (empty folders are never listed twice).
+class FolderTreeCache:
+
+    def __init__(self, read_images):
+        # read_images(folder) -> FolderModel of the images in folder,
+        # must be safe to call from a worker thread
+        self.read_images = read_images
+        self.lock = threading.Lock()
+        # folder -> (mtime_ns, FolderModel)
+        self.subfolders = {}
+        self.images = OrderedDict()
+        # folder -> (mtime_ns, number of images)
+        self.counts = {}
+        # (folder, direction) -> (sibling, FolderModel), for the last prefetch
+        self.siblings = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='iw-tree')
+        self.pending = None
+
+    def getMtime(self, folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def readSubfolders(self, folder):
+        # is_dir() uses d_type, no stat per entry
+        with os.scandir(folder) as entries:
+            return FolderModel([entry.name for entry in entries if entry.is_dir()])
+
+    def getSubfolders(self, folder):
+        mtime = self.getMtime(folder)
+        if mtime is None:
+            return FolderModel()
+        with self.lock:
+            cached = self.subfolders.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            model = self.readSubfolders(folder)
+        except OSError:
+            model = FolderModel()
+        with self.lock:
+            self.subfolders[folder] = (mtime, model)
+        return model
+
+    def getImages(self, folder):
+        # NOTE: the model is shared, copy it before changing it
+        mtime = self.getMtime(folder)
+        if mtime is None:
+            return FolderModel()
+        with self.lock:
+            cached = self.images.get(folder)
+            if cached is not None and cached[0] == mtime:
+                self.images.move_to_end(folder)
+                return cached[1]
+        try:
+            model = self.read_images(folder)
+        except OSError:
+            model = FolderModel()
+        with self.lock:
+            self.images[folder] = (mtime, model)
+            self.counts[folder] = (mtime, len(model))
+            while len(self.images) > MAX_CACHED_LISTINGS:
+                self.images.popitem(last=False)
+        return model
+
+    def getImageCount(self, folder):
+        mtime = self.getMtime(folder)
+        with self.lock:
+            cached = self.counts.get(folder)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        return len(self.getImages(folder))
+
+    def getSibling(self, folder, direction):
+        # Closest sibling of folder in direction (NEXT or PREV) with images,
+        # as (path, FolderModel), (None, None) if there are none
+        parent = os.path.dirname(folder)
+        siblings = self.getSubfolders(parent)
+        position = siblings.getPosition(os.path.basename(folder))
+        if position == -1:
+            return None, None
+        position += direction
+        while 0 <= position < len(siblings):
+            candidate = os.path.join(parent, siblings[position])
+            if self.getImageCount(candidate) > 0:
+                images = self.getImages(candidate)
+                if len(images) > 0:
+                    return candidate, images
+            position += direction
+        return None, None
+
+    def prefetchSiblings(self, folder, on_done):
+        # Find the previous and next sibling in the background,
+        # on_done(folder) is called from the worker thread
+        if self.pending is not None:
+            self.pending.cancel()
+        with self.lock:
+            self.siblings = {}
+
+        def run():
+            for direction in (NEXT, PREV):
+                sibling = self.getSibling(folder, direction)
+                with self.lock:
+                    self.siblings[(folder, direction)] = sibling
+            on_done(folder)
+
+        self.pending = self.executor.submit(run)
+
+    def peekSibling(self, folder, direction):
+        # Result of the last prefetch, without touching the disk
+        with self.lock:
+            return self.siblings.get((folder, direction), (None, None))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
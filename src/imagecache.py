@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+
+from collections import OrderedDict
+
+RENDITION = 'rendition'
+
+
+def getPixbufBytes(pixbuf):
+    return pixbuf.get_rowstride() * pixbuf.get_height()
+
+
+def getRenditionKey(key, width, height):
+    # Key of a scaled copy of the image with the given key
+    return key[:3] + ((RENDITION, width, height),)
+
+
+def isRenditionKey(key):
+    return isinstance(key[3], tuple) and key[3][0] == RENDITION
+
+
+## Decoded images cache
+# LRU cache of decoded pixbufs bounded by the memory they use.
+# Entries are keyed by (realpath, mtime, size) so that
+# a file edited on disk is never served from the cache.
+class ImageCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def getKey(path):
+        stat = os.stat(path)
+        return os.path.realpath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            else:
+                self.misses += 1
+                return None
+
+    def put(self, key, pixbuf):
+        size = getPixbufBytes(pixbuf)
+        if size > self.max_bytes:
+            # Would evict everything else
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (pixbuf, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def remove(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def removeRenditions(self, keep_paths):
+        # Drop the scaled copies of the images not in keep_paths
+        with self.lock:
+            for key in list(self.entries):
+                if isRenditionKey(key) and key[0] not in keep_paths:
+                    self._remove(key)
+
+    def _remove(self, key):
+        _, size = self.entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def getStats(self):
+        with self.lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self.entries),
+                    'bytes': self.current_bytes,
+                    'max_bytes': self.max_bytes}
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from gi.repository import GdkPixbuf
+
+PARALLEL_MIN_PIXELS = 2 * 1024 * 1024  # Smaller outputs are scaled in one call
+MIN_BAND_HEIGHT = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def getExecutor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='iw-scale')
+        return _executor
+
+
+def getBands(height, count):
+    # Split [0, height) in count horizontal bands
+    count = max(min(count, height // MIN_BAND_HEIGHT), 1)
+    band_height = -(-height // count)
+    return [(y, min(band_height, height - y)) for y in range(0, height, band_height)]
+
+
+# Scale pixbuf to width x height splitting the destination in bands
+# scaled concurrently (GdkPixbuf releases the GIL while scaling).
+# Each band writes to its own rows of the destination pixbuf.
+def scaleParallel(pixbuf, width, height, interp=GdkPixbuf.InterpType.BILINEAR):
+    workers = os.cpu_count() or 1
+    if width * height < PARALLEL_MIN_PIXELS or workers == 1:
+        return pixbuf.scale_simple(width, height, interp)
+    dest = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, pixbuf.get_has_alpha(), 8, width, height)
+    scale_x = width / pixbuf.get_width()
+    scale_y = height / pixbuf.get_height()
+    executor = getExecutor()
+    futures = []
+    for y, band_height in getBands(height, workers):
+        futures.append(executor.submit(pixbuf.scale, dest, 0, y, width, band_height,
+                                       0, 0, scale_x, scale_y, interp))
+    for future in futures:
+        future.result()
+    return dest
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+# Modes GdkPixbuf can use as they are
+NATIVE_MODES = ('RGB', 'RGBA')
+# Modes which carry an alpha channel
+ALPHA_MODES = ('RGBA', 'RGBa', 'LA', 'La', 'PA')
+# High bit depth modes, scaled down to 8 bits
+DEEP_MODES = {'I;16': 1 / 256, 'I;16L': 1 / 256, 'I;16B': 1 / 256, 'I;16N': 1 / 256,
+              'I': 1 / 256}
+# Float images have no fixed range (often 0..1), theirs is stretched to 8 bits
+FLOAT_MODE = 'F'
+
+
+def normalizeMode(image):
+    # Return an RGB or RGBA image with at most one conversion
+    mode = image.mode
+    if mode in NATIVE_MODES:
+        return image
+    if mode in DEEP_MODES:
+        # point() with a linear function runs in C, no per-pixel callback
+        scale = DEEP_MODES[mode]
+        image = image.point(lambda x: x * scale, 'L')
+        return image.convert('RGB')
+    if mode == FLOAT_MODE:
+        low, high = image.getextrema()
+        scale = 255 / (high - low) if high > low else 0
+        image = image.point(lambda x: (x - low) * scale, 'L')
+        return image.convert('RGB')
+    if mode in ALPHA_MODES or (mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA')
+    # L, 1, P, CMYK, YCbCr, LAB, HSV
+    return image.convert('RGB')
+
+
+# Calling pixbuf.scale_simple may cause a segmentation fault, see:
+# https://bugzilla.gnome.org/show_bug.cgi?id=747431
+def convertPilImageToGdkPixbuf(image):
+    image = normalizeMode(image)
+    width, height = image.size
+    has_alpha = image.mode == 'RGBA'
+    # PIL rows are packed
+    row_stride = (4 if has_alpha else 3) * width
+    # NOTE: the pixels are copied three times: tobytes() encodes them
+    # in chunks then joins the chunks, and GLib.Bytes copies the result
+    # into GLib memory (PyGObject gives no way to hand over a Python buffer)
+    data = GLib.Bytes.new(image.tobytes())
+    return GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB, has_alpha, 8, width, height, row_stride)
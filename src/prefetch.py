@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+PREFETCH_WORKERS = 2
+
+
+## Prefetcher
+# Decode the images around the current one on a worker pool,
+# so that a navigation step only has to swap in a loaded image.
+class ImagePrefetcher:
+
+    def __init__(self, load_image, next_count, prev_count):
+        # load_image(path) must be safe to call from a worker thread
+        self.load_image = load_image
+        self.next_count = next_count
+        self.prev_count = prev_count
+        self.executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='iw-prefetch')
+        self.pending = {}
+
+    def isEnabled(self):
+        return self.next_count > 0 or self.prev_count > 0
+
+    def getWindow(self, folder, files, position):
+        # Closest images first, alternating next and previous
+        window = []
+        for distance in range(1, max(self.next_count, self.prev_count) + 1):
+            if distance <= self.next_count and position + distance < len(files):
+                window.append(os.path.join(folder, files[position + distance]))
+            if distance <= self.prev_count and position - distance >= 0:
+                window.append(os.path.join(folder, files[position - distance]))
+        return window
+
+    def update(self, folder, files, position, extra=()):
+        # extra: more paths to decode, after the window
+        if not self.isEnabled() or position < 0:
+            self.clear()
+            return
+        window = self.getWindow(folder, files, position) + list(extra)
+        # Drop the images which left the window
+        for path in list(self.pending):
+            if path not in window:
+                self.pending.pop(path).cancel()
+        for path in window:
+            if path not in self.pending:
+                self.pending[path] = self.executor.submit(self.load_image, path)
+
+    def takeIfDone(self, path):
+        # Return the prefetched image only if it is already decoded
+        future = self.pending.get(path)
+        if future is None or not future.done():
+            return None
+        return self.take(path)
+
+    def takeFuture(self, path):
+        # Return the Future decoding path (None if never requested)
+        return self.pending.pop(path, None)
+
+    def retain(self, paths):
+        # Abandon the images not in paths
+        for path in list(self.pending):
+            if path not in paths:
+                self.pending.pop(path).cancel()
+
+    def take(self, path):
+        # Return the prefetched image (waiting for it if still decoding)
+        # or None if the path was never requested
+        future = self.pending.pop(path, None)
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def clear(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
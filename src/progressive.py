@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+CHUNK_SIZE = 256 * 1024  # bytes fed to the loader per main loop iteration
+
+
+## Progressive loader
+# Feed a file to a PixbufLoader in chunks from an idle source,
+# so that the main loop keeps running while a big image is decoded.
+class ProgressiveLoader:
+
+    def __init__(self, path, size=None, on_update=None, on_done=None):
+        self.path = path
+        # Decode at this size (None: native size)
+        self.size = size
+        self.on_update = on_update
+        self.on_done = on_done
+        self.loader = None
+        self.handle = None
+        self.source_id = None
+
+    def start(self):
+        self.handle = open(self.path, 'rb')
+        self.loader = GdkPixbuf.PixbufLoader()
+        self.loader.connect('size-prepared', self.onSizePrepared)
+        self.loader.connect('area-updated', self.onAreaUpdated)
+        self.source_id = GLib.idle_add(self.readChunk, priority=GLib.PRIORITY_DEFAULT_IDLE)
+
+    def onSizePrepared(self, loader, width, height):
+        if self.size is not None:
+            loader.set_size(*self.size)
+
+    def onAreaUpdated(self, loader, x, y, width, height):
+        if self.on_update is not None:
+            self.on_update(loader.get_pixbuf())
+
+    def readChunk(self):
+        try:
+            data = self.handle.read(CHUNK_SIZE)
+            if len(data) > 0:
+                self.loader.write(data)
+                return True
+            self.loader.close()
+            pixbuf = self.loader.get_pixbuf()
+        except (GLib.Error, OSError):
+            pixbuf = None
+        self.source_id = None
+        self._release()
+        if self.on_done is not None:
+            self.on_done(pixbuf)
+        return False
+
+    def cancel(self):
+        if self.source_id is not None:
+            GLib.source_remove(self.source_id)
+            self.source_id = None
+        if self.loader is not None:
+            try:
+                self.loader.close()
+            except GLib.Error:
+                # Incomplete image
+                pass
+        self._release()
+
+    def _release(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        self.loader = None
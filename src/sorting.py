@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import functools
+import os
+import re
+import time
+
+from PIL import Image
+
+# Import natsort if available
+try:
+    import natsort
+    from natsort import natsort_keygen
+    natural_key = natsort_keygen()
+    NATURAL_KEY_VERSION = 'natsort ' + natsort.__version__
+except ImportError:
+    NATURAL_KEY_VERSION = 'fallback'
+    DIGITS = re.compile(r'(\d+)')
+
+    def natural_key(name):
+        # Text and numbers alternate, so keys always compare
+        parts = DIGITS.split(name)
+        parts[1::2] = map(int, parts[1::2])
+        return tuple(parts)
+
+SORT_NAME = 'name'
+SORT_MTIME = 'mtime'
+SORT_SIZE = 'size'
+SORT_EXIF_DATE = 'exif_date'
+SORT_ORDERS = [SORT_NAME, SORT_MTIME, SORT_SIZE, SORT_EXIF_DATE]
+
+NATURAL_KEY_CACHE = 256 * 1024  # Names whose key is kept between listings
+
+EXIF_IFD = 0x8769
+EXIF_DATE_TIME = 0x0132
+EXIF_DATE_TIME_ORIGINAL = 0x9003
+EXIF_DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+
+@functools.lru_cache(maxsize=NATURAL_KEY_CACHE)
+def getNaturalKey(name):
+    # Natural order ignoring the case, then the name itself for ties
+    return natural_key(name.lower()), name
+
+
+def getExifDate(path):
+    # Date the photo was taken, as in the EXIF data ('YYYY:MM:DD HH:MM:SS')
+    try:
+        with Image.open(path) as img:
+            exif = img.getexif()
+            date = exif.get_ifd(EXIF_IFD).get(EXIF_DATE_TIME_ORIGINAL) or exif.get(EXIF_DATE_TIME)
+    except Exception:
+        return None
+    return date if isinstance(date, str) else None
+
+
+## Sort engine
+# Sort keys of the images of a folder for the configured order.
+# Keys are computed from the os.DirEntry while listing: the name order
+# needs no stat at all, mtime and size orders use DirEntry.stat()
+# which is cached in the entry (and free on Windows).
+# Ties are broken by the natural order of the names.
+class SortEngine:
+
+    def __init__(self, order=SORT_NAME):
+        self.order = order if order in SORT_ORDERS else SORT_NAME
+
+    def isNameOrder(self):
+        return self.order == SORT_NAME
+
+    def getTag(self):
+        # Changes when the same names may be sorted differently
+        return '%s/%s' % (self.order, NATURAL_KEY_VERSION)
+
+    def getEntryKey(self, entry):
+        if self.order == SORT_NAME:
+            return getNaturalKey(entry.name)
+        return self._getKey(entry.path, entry.name, entry.stat)
+
+    def getPathKey(self, path):
+        name = os.path.basename(path)
+        if self.order == SORT_NAME:
+            return getNaturalKey(name)
+        return self._getKey(path, name, lambda: os.stat(path))
+
+    def _getKey(self, path, name, get_stat):
+        try:
+            stat = get_stat()
+        except OSError:
+            # Gone, sort as if empty and very old
+            stat = None
+        if self.order == SORT_MTIME:
+            value = stat.st_mtime_ns if stat is not None else 0
+        elif self.order == SORT_SIZE:
+            value = stat.st_size if stat is not None else 0
+        else:
+            value = getExifDate(path)
+            if value is None:
+                mtime = stat.st_mtime if stat is not None else 0
+                value = time.strftime(EXIF_DATE_FORMAT, time.localtime(mtime))
+        return value, getNaturalKey(name)
+
+    def getKeyFunction(self, folder):
+        # name -> key for the names of folder not listed yet
+        if self.order == SORT_NAME:
+            return getNaturalKey
+        return lambda name: self.getPathKey(os.path.join(folder, name))
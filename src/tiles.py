@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+
+from gi.repository import Gdk
+from gi.repository import GdkPixbuf
+from gi.repository import Gtk
+
+TILE_SIZE = 256
+MIN_CACHED_TILES = 16
+
+
+## Tiled renderer
+# Draw a zoomed image scaling only the tiles which intersect
+# the visible area, memory depends on the viewport and not on the zoom.
+class TiledRenderer:
+
+    def __init__(self):
+        self.area = Gtk.DrawingArea()
+        self.area.set_halign(Gtk.Align.CENTER)
+        self.area.set_valign(Gtk.Align.CENTER)
+        self.area.connect('draw', self.onDraw)
+        self.pixbuf = None
+        self.width = 0
+        self.height = 0
+        self.tiles = OrderedDict()
+        self.max_tiles = MIN_CACHED_TILES
+
+    def getWidget(self):
+        return self.area
+
+    def setSource(self, pixbuf, width, height):
+        # Show pixbuf scaled to width x height
+        if pixbuf is not self.pixbuf or width != self.width or height != self.height:
+            self.tiles.clear()
+        self.pixbuf = pixbuf
+        self.width = width
+        self.height = height
+        self.area.set_size_request(width, height)
+        self.area.queue_draw()
+
+    def clear(self):
+        self.pixbuf = None
+        self.tiles.clear()
+        self.max_tiles = MIN_CACHED_TILES
+
+    def onDraw(self, widget, cr):
+        context = widget.get_style_context()
+        allocation = widget.get_allocation()
+        Gtk.render_background(context, cr, 0, 0, allocation.width, allocation.height)
+        if self.pixbuf is None:
+            return False
+        is_clipped, clip = Gdk.cairo_get_clip_rectangle(cr)
+        if not is_clipped:
+            return False
+        first_col = max(clip.x // TILE_SIZE, 0)
+        first_row = max(clip.y // TILE_SIZE, 0)
+        last_col = min((clip.x + clip.width - 1) // TILE_SIZE, (self.width - 1) // TILE_SIZE)
+        last_row = min((clip.y + clip.height - 1) // TILE_SIZE, (self.height - 1) // TILE_SIZE)
+        # Keep the visible tiles and about as many around them
+        visible = (last_col - first_col + 1) * (last_row - first_row + 1)
+        self.max_tiles = max(self.max_tiles, 2 * visible)
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                x = col * TILE_SIZE
+                y = row * TILE_SIZE
+                tile = self.getTile(col, row)
+                Gdk.cairo_set_source_pixbuf(cr, tile, x, y)
+                cr.rectangle(x, y, tile.get_width(), tile.get_height())
+                cr.fill()
+        return False
+
+    def getTile(self, col, row):
+        key = (col, row)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+        tile = self.renderTile(col, row)
+        self.tiles[key] = tile
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def renderTile(self, col, row):
+        x = col * TILE_SIZE
+        y = row * TILE_SIZE
+        width = min(TILE_SIZE, self.width - x)
+        height = min(TILE_SIZE, self.height - y)
+        tile = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, self.pixbuf.get_has_alpha(), 8, width, height)
+        scale_x = self.width / self.pixbuf.get_width()
+        scale_y = self.height / self.pixbuf.get_height()
+        self.pixbuf.scale(tile, 0, 0, width, height, -x, -y, scale_x, scale_y, GdkPixbuf.InterpType.BILINEAR)
+        return tile
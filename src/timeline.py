@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import bisect
+
+## Animation timeline
+# Frame shown at a time of an animation played `plays` times (0: forever).
+# frame_ends[i] is the time (ms) when frame i ends within a loop,
+# a frame is found by bisection, O(log n) whatever the elapsed time.
+
+
+def getFrameAt(frame_ends, elapsed, plays):
+    # Index of the frame shown elapsed ms after the start
+    total = frame_ends[-1] if len(frame_ends) > 0 else 0
+    if total <= 0:
+        return 0
+    if plays > 0 and elapsed >= total * plays:
+        # Stop on the last frame
+        return len(frame_ends) - 1
+    return bisect.bisect_right(frame_ends, elapsed % total)
+
+
+def getAbsoluteFrameAt(frame_ends, elapsed, plays):
+    # Absolute frame (loop * frame count + index) shown elapsed ms after the start
+    total = frame_ends[-1] if len(frame_ends) > 0 else 0
+    if total <= 0:
+        return 0
+    frame_count = len(frame_ends)
+    if plays > 0 and elapsed >= total * plays:
+        return frame_count * plays - 1
+    loop, position = divmod(elapsed, total)
+    return int(loop) * frame_count + bisect.bisect_right(frame_ends, position)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import bisect
+import os
+import random
+
+from array import array
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from .sorting import getNaturalKey
+
+WALK_WORKERS = min(8, os.cpu_count() or 1)  # scandir releases the GIL
+INDEX_MASK = (1 << 32) - 1  # Index in the folder of a shuffled entry
+
+
+def walkTree(root, is_image, workers=WALK_WORKERS):
+    # Return {folder: [image names]} for the folders under root with images.
+    # Folders are scanned concurrently, hidden folders and links to folders
+    # are not followed.
+    def scan(folder):
+        subfolders = []
+        images = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name[0] != '.':
+                            subfolders.append(entry.path)
+                    elif is_image(entry):
+                        images.append(entry.name)
+        except OSError:
+            pass
+        return folder, subfolders, images
+
+    listings = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='iw-walk') as executor:
+        pending = {executor.submit(scan, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder, subfolders, images = future.result()
+                if len(images) > 0:
+                    listings[folder] = images
+                for subfolder in subfolders:
+                    pending.add(executor.submit(scan, subfolder))
+    return listings
+
+
+def getFolderKey(folder):
+    # Parents sort before their subfolders
+    if folder == '':
+        return ()
+    return tuple(getNaturalKey(part) for part in folder.split(os.sep))
+
+
+## Tree index
+# Navigation order of all the images under a root folder.
+# Same interface as FolderModel, with names relative to the root.
+# Each folder is stored once with the sorted list of its image names.
+# Folder ids never change (index in self.folders), self.sequence lists
+# them in folder order and self.starts holds the first position of each.
+# When shuffled, self.order holds (folder id << 32 | index in the folder)
+# for each position and self.positions[folder id] the position of each
+# index: a change only renumbers the entries of its own folder.
+class TreeIndex:
+
+    def __init__(self, root, listings=None):
+        # listings: {folder: [image names]}, as returned by walkTree
+        self.root = root
+        self.folders = []
+        self.names = []
+        self.folder_ids = {}
+        for folder, names in (listings or {}).items():
+            relative = os.path.relpath(folder, root)
+            relative = '' if relative == '.' else relative
+            self.folder_ids[relative] = len(self.folders)
+            self.folders.append(relative)
+            self.names.append(sorted(names, key=getNaturalKey))
+        self.sequence = sorted(range(len(self.folders)), key=lambda folder_id: getFolderKey(self.folders[folder_id]))
+        self.folder_keys = [getFolderKey(self.folders[folder_id]) for folder_id in self.sequence]
+        self.slots = array('L')
+        self.starts = array('L')
+        self.updateFolders()
+        self.shuffled = False
+        self.order = None
+        self.positions = None
+
+    def updateFolders(self):
+        # O(folders), after a folder was added
+        self.slots = array('L', [0]) * len(self.folders)
+        self.starts = array('L')
+        total = 0
+        for slot, folder_id in enumerate(self.sequence):
+            self.slots[folder_id] = slot
+            self.starts.append(total)
+            total += len(self.names[folder_id])
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.total
+        if not 0 <= position < self.total:
+            raise IndexError('position out of range')
+        if self.shuffled:
+            entry = self.order[position]
+            folder_id, index = entry >> 32, entry & INDEX_MASK
+        else:
+            slot = bisect.bisect_right(self.starts, position) - 1
+            folder_id, index = self.sequence[slot], position - self.starts[slot]
+        return os.path.join(self.folders[folder_id], self.names[folder_id][index])
+
+    def __contains__(self, name):
+        return self.getPosition(name) != -1
+
+    def _find(self, name):
+        # (folder id, index in the folder, found) of a relative name
+        folder, filename = os.path.split(name)
+        folder_id = self.folder_ids.get(folder)
+        if folder_id is None:
+            return None, -1, False
+        names = self.names[folder_id]
+        index = bisect.bisect_left(names, getNaturalKey(filename), key=getNaturalKey)
+        return folder_id, index, index < len(names) and names[index] == filename
+
+    def getPosition(self, name):
+        folder_id, index, found = self._find(name)
+        if not found:
+            return -1
+        if self.shuffled:
+            return self.positions[folder_id][index]
+        return self.starts[self.slots[folder_id]] + index
+
+    def _addFolder(self, folder):
+        folder_id = len(self.folders)
+        key = getFolderKey(folder)
+        slot = bisect.bisect_left(self.folder_keys, key)
+        self.folder_keys.insert(slot, key)
+        self.sequence.insert(slot, folder_id)
+        self.folder_ids[folder] = folder_id
+        self.folders.append(folder)
+        self.names.append([])
+        if self.shuffled:
+            self.positions.append(array('L'))
+        self.updateFolders()
+        return folder_id
+
+    def _moveStarts(self, folder_id, step):
+        starts = self.starts
+        for slot in range(self.slots[folder_id] + 1, len(starts)):
+            starts[slot] += step
+        self.total += step
+
+    def insert(self, name):
+        # Add name in order (at a random position when shuffled),
+        # return its position
+        folder_id, index, found = self._find(name)
+        if found:
+            return self.getPosition(name)
+        if folder_id is None:
+            folder_id, index = self._addFolder(os.path.dirname(name)), 0
+        self.names[folder_id].insert(index, os.path.basename(name))
+        self._moveStarts(folder_id, 1)
+        if not self.shuffled:
+            return self.starts[self.slots[folder_id]] + index
+        order = self.order
+        positions = self.positions[folder_id]
+        # The next names of the folder moved by one
+        for position in positions[index:]:
+            order[position] += 1
+        positions.insert(index, 0)
+        # Random slot, its entry moves to the end
+        entry = folder_id << 32 | index
+        position = random.randint(0, len(order))
+        if position < len(order):
+            moved = order[position]
+            order[position] = entry
+            self.positions[moved >> 32][moved & INDEX_MASK] = len(order)
+            order.append(moved)
+        else:
+            order.append(entry)
+        positions[index] = position
+        return position
+
+    def remove(self, name):
+        folder_id, index, found = self._find(name)
+        if not found:
+            return False
+        if self.shuffled:
+            order = self.order
+            positions = self.positions[folder_id]
+            # The last entry fills the hole
+            position = positions[index]
+            last = order.pop()
+            if position < len(order):
+                order[position] = last
+                self.positions[last >> 32][last & INDEX_MASK] = position
+            del positions[index]
+            # The next names of the folder moved by one
+            for position in positions[index:]:
+                order[position] -= 1
+        del self.names[folder_id][index]
+        self._moveStarts(folder_id, -1)
+        return True
+
+    def update(self, added=(), removed=()):
+        # Apply a batch of changes, return True if the names changed
+        changed = False
+        for name in removed:
+            changed = self.remove(name) or changed
+        for name in added:
+            if name not in self:
+                self.insert(name)
+                changed = True
+        return changed
+
+    def shuffle(self, first=None):
+        # Random order, with first (if present) as first element.
+        # NOTE: O(n) in Python, done by the listing thread
+        self.order = array('Q', (folder_id << 32 | index
+                                 for folder_id, names in enumerate(self.names)
+                                 for index in range(len(names))))
+        random.shuffle(self.order)
+        self.positions = [array('L', [0]) * len(names) for names in self.names]
+        positions = self.positions
+        for position, entry in enumerate(self.order):
+            positions[entry >> 32][entry & INDEX_MASK] = position
+        self.shuffled = True
+        if first is not None:
+            self.setFirst(first)
+
+    def setFirst(self, name):
+        # Shuffle mode: swap name with the first element
+        position = self.getPosition(name)
+        if position <= 0:
+            return
+        order = self.order
+        entry, first = order[position], order[0]
+        order[0], order[position] = entry, first
+        self.positions[entry >> 32][entry & INDEX_MASK] = 0
+        self.positions[first >> 32][first & INDEX_MASK] = position
@@ -0,0 +1,110 @@
+import itertools
+import random
+
+import pytest
+
+from src.timeline import getAbsoluteFrameAt
+from src.timeline import getFrameAt
+
+
+def getReferenceFrame(delays, elapsed, plays):
+    # Walk the frames one by one: (loop, index) shown at elapsed
+    time = 0
+    for loop in itertools.count():
+        for index, delay in enumerate(delays):
+            if plays > 0 and loop == plays:
+                return plays - 1, len(delays) - 1
+            if elapsed < time + delay:
+                return loop, index
+            time += delay
+
+
+def advance(delays, plays, ticks):
+    # Frames shown by a player ticking at the given times (ms)
+    frame_ends = list(itertools.accumulate(delays))
+    return [(getFrameAt(frame_ends, tick, plays), getAbsoluteFrameAt(frame_ends, tick, plays)) for tick in ticks]
+
+
+@pytest.mark.parametrize('delays', [[100], [20, 30, 50], [10, 500, 10, 10, 70], [16] * 40])
+@pytest.mark.parametrize('plays', [0, 1, 3])
+def test_irregular_ticks(delays, plays):
+    random.seed(len(delays) * 10 + plays)
+    total = sum(delays)
+    # Irregular wall clock, up to well past the whole animation
+    ticks = [0.0]
+    while ticks[-1] < total * 5:
+        ticks.append(ticks[-1] + random.uniform(0, 40))
+    # Frame boundaries exactly
+    ticks.extend(itertools.accumulate(delays * 4))
+    for tick, (index, absolute) in zip(ticks, advance(delays, plays, ticks)):
+        loop, expected = getReferenceFrame(delays, tick, plays)
+        assert index == expected, tick
+        assert absolute == loop * len(delays) + expected, tick
+
+
+def test_stops_on_last_frame():
+    frame_ends = [100, 200, 300]
+    assert getFrameAt(frame_ends, 299.9, 1) == 2
+    assert getFrameAt(frame_ends, 300, 1) == 2
+    assert getFrameAt(frame_ends, 10 ** 9, 2) == 2
+    assert getAbsoluteFrameAt(frame_ends, 10 ** 9, 2) == 5
+    # Forever
+    assert getFrameAt(frame_ends, 300, 0) == 0
+    assert getAbsoluteFrameAt(frame_ends, 300 * 10 ** 6 + 150, 0) == 3 * 10 ** 6 + 1
+
+
+def test_empty_timeline():
+    assert getFrameAt([], 1000, 0) == 0
+    assert getAbsoluteFrameAt([], 1000, 1) == 0
+
+
+def test_gif_animation_advance(tmp_path):
+    # GIFAnimation.advance with explicit times (seconds), needs GTK
+    pytest.importorskip('gi')
+    from PIL import Image
+    from src.ImageViewer import GIFAnimation
+
+    path = tmp_path / 'loop.gif'
+    frames = [Image.new('P', (4, 4), color) for color in (1, 2, 3)]
+    # Netscape loop 1: played twice
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=[20, 30, 50], loop=1)
+    animation = GIFAnimation(str(path))
+    animation.load()
+    assert animation.getPlays() == 2
+    shown = []
+    for time in (0.0, 0.015, 0.049, 0.05, 0.099, 0.1, 0.125, 0.35, 2.0):
+        animation.advance(time)
+        shown.append(animation.getFrameIndex())
+    assert shown == [0, 0, 1, 2, 2, 0, 1, 2, 2]
+    animation.close()
+
+
+class CountingList(list):
+    # Counts the reads done by the lookup (bisect reads through __getitem__)
+    reads = 0
+
+    def __getitem__(self, index):
+        CountingList.reads += 1
+        return super().__getitem__(index)
+
+
+def getReads(lookup, frame_ends, ticks, plays):
+    reads = []
+    for tick in ticks:
+        CountingList.reads = 0
+        lookup(frame_ends, tick, plays)
+        reads.append(CountingList.reads)
+    return reads
+
+
+@pytest.mark.parametrize('lookup', [getFrameAt, getAbsoluteFrameAt])
+def test_constant_cost_per_tick(lookup):
+    # A short loop ticked at 60 Hz for one second, at hour 0 and hour 10:
+    # the work per tick must not grow with the elapsed time
+    frame_ends = CountingList(itertools.accumulate([40, 60, 20, 80] * 8))
+    hour = 3600 * 1000
+    first = getReads(lookup, frame_ends, [tick * 1000 / 60 for tick in range(60)], 0)
+    later = getReads(lookup, frame_ends, [10 * hour + tick * 1000 / 60 for tick in range(60)], 0)
+    assert max(later) <= max(first)
+    # O(log n): a bisection plus the total duration
+    assert max(later) <= len(frame_ends).bit_length() + 2
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+from PIL import Image
+
+from src.animationfile import isAnimatedFile
+
+
+def saveFrames(path, count, **kwargs):
+    frames = [Image.new('RGB', (8, 8), (40 * index, 0, 0)) for index in range(count)]
+    frames[0].save(path, save_all=count > 1, append_images=frames[1:], duration=50, **kwargs)
+
+
+@pytest.mark.parametrize('extension', ['.png', '.webp'])
+def test_animated_header(tmp_path, extension):
+    animated = str(tmp_path / ('animated' + extension))
+    static = str(tmp_path / ('static' + extension))
+    saveFrames(animated, 3)
+    saveFrames(static, 1)
+    assert isAnimatedFile(animated)
+    assert not isAnimatedFile(static)
+    with Image.open(animated) as img:
+        assert img.is_animated
+
+
+def test_file_replaced(tmp_path):
+    path = str(tmp_path / 'image.png')
+    saveFrames(path, 1)
+    assert not isAnimatedFile(path)
+    saveFrames(path, 2)
+    # A new version of the file is checked again
+    os.utime(path, ns=(0, 10 ** 9))
+    assert isAnimatedFile(path)
+
+
+def test_not_an_image(tmp_path):
+    path = tmp_path / 'broken.png'
+    path.write_bytes(b'\x89PNG\r\n\x1a\n\x00\x00')
+    assert not isAnimatedFile(str(path))
+    assert not isAnimatedFile(str(tmp_path / 'missing.webp'))
@@ -0,0 +1,52 @@
+import os
+import sqlite3
+
+from src import folderindex
+from src.folderindex import FolderIndex
+
+
+def test_listing_tag(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    index = FolderIndex(path, 'name/natsort 8.4.0 .jpg .png')
+    index.putListing('/photos', 10, ['a.jpg', 'b.png'])
+    assert index.getListing('/photos', 10) == ['a.jpg', 'b.png']
+    assert index.getListing('/photos', 11) is None
+    index.close()
+    # Stored with another order or natural key: not trusted
+    index = FolderIndex(path, 'name/fallback .jpg .png')
+    assert index.getListing('/photos', 10) is None
+    index.close()
+
+
+def test_old_schema_dropped(tmp_path):
+    path = str(tmp_path / 'index.sqlite')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE folders (path TEXT PRIMARY KEY, mtime INTEGER NOT NULL, names TEXT NOT NULL)')
+    connection.execute("INSERT INTO folders VALUES ('/photos', 10, 'b.jpg')")
+    connection.commit()
+    connection.close()
+    index = FolderIndex(path, 'tag')
+    assert index.getListing('/photos', 10) is None
+    index.putListing('/photos', 10, ['a.jpg'])
+    assert index.getListing('/photos', 10) == ['a.jpg']
+    index.close()
+
+
+def test_prune(tmp_path, monkeypatch):
+    monkeypatch.setattr(folderindex, 'IMAGES_MAX', 5)
+    monkeypatch.setattr(folderindex, 'FOLDERS_MAX', 2)
+    monkeypatch.setattr(folderindex, 'PRUNE_INTERVAL', 4)
+    index = FolderIndex(str(tmp_path / 'index.sqlite'))
+    stat = os.stat(tmp_path)
+    for number in range(12):
+        index.putImageSize('/photos/%d.jpg' % number, stat, number, number)
+    for number in range(4):
+        index.putListing('/folder%d' % number, 1, ['a.jpg'])
+    index.prune()
+    # The sizes stored last are kept
+    assert index.getImageSize('/photos/11.jpg', stat) == (11, 11)
+    assert index.getImageSize('/photos/7.jpg', stat) == (7, 7)
+    assert index.getImageSize('/photos/6.jpg', stat) is None
+    assert index.getListing('/folder3', 1) == ['a.jpg']
+    assert index.getListing('/folder1', 1) is None
+    index.close()
@@ -0,0 +1,49 @@
+import random
+
+from src.foldermodel import FolderModel
+
+
+def checkIndex(model):
+    for position, name in enumerate(model):
+        assert model.getPosition(name) == position
+
+
+def test_sorted_insert_remove():
+    model = FolderModel(['img10.jpg', 'img2.jpg', 'img1.jpg'])
+    assert list(model) == ['img1.jpg', 'img2.jpg', 'img10.jpg']
+    assert model.insert('img3.jpg') == 2
+    assert model.remove('img2.jpg')
+    assert not model.remove('img2.jpg')
+    assert list(model) == ['img1.jpg', 'img3.jpg', 'img10.jpg']
+    checkIndex(model)
+
+
+def test_shuffled_keeps_index():
+    random.seed(1)
+    model = FolderModel(['%d.jpg' % i for i in range(100)])
+    model.shuffle('42.jpg')
+    assert model[0] == '42.jpg'
+    for i in range(100, 150):
+        position = model.insert('%d.jpg' % i)
+        assert model[position] == '%d.jpg' % i
+    for i in range(0, 150, 3):
+        assert model.remove('%d.jpg' % i)
+    checkIndex(model)
+    assert sorted(model.getSorted()) == sorted('%d.jpg' % i for i in range(150) if i % 3 != 0)
+
+
+def test_update_batch():
+    names = ['%d.jpg' % i for i in range(0, 100, 2)]
+    for shuffled in (False, True):
+        model = FolderModel(names)
+        if shuffled:
+            model.shuffle()
+        added = ['%d.jpg' % i for i in range(1, 100, 2)] + ['0.jpg']
+        removed = ['%d.jpg' % i for i in range(0, 100, 4)] + ['missing.jpg']
+        assert model.update(added, removed)
+        assert not model.update(['1.jpg'], ['missing.jpg'])
+        expected = sorted(set(names + added) - set(removed), key=model.getSortKey)
+        assert model.getSorted() == expected
+        if not shuffled:
+            assert list(model) == expected
+        checkIndex(model)
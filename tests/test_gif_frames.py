@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+from PIL import Image
+
+from src.animationfile import iterFrames
+
+# Palette: transparent, red, green, blue
+PALETTE = [(0, 0, 0), (255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 0, 0), (0, 0, 0), (0, 0, 0), (0, 0, 0)]
+TRANSPARENT = 0
+SIZE = (6, 4)
+LZW_MIN_CODE_SIZE = 3
+CLEAR = 1 << LZW_MIN_CODE_SIZE
+
+
+def encodeLZW(pixels):
+    # Literal codes only, with a clear code before the table grows
+    # past 4 bits: valid LZW for any decoder
+    codes = []
+    for start in range(0, len(pixels), 4):
+        codes.append(CLEAR)
+        codes.extend(pixels[start:start + 4])
+    codes.append(CLEAR + 1)
+    value = sum(code << (4 * i) for i, code in enumerate(codes))
+    data = value.to_bytes((4 * len(codes) + 7) // 8, 'little')
+    blocks = b''.join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255))
+    return bytes([LZW_MIN_CODE_SIZE]) + blocks + b'\0'
+
+
+def writeGIF(path, frames, delay=10):
+    # frames: [(box, pixels, disposal)], pixels are palette indices,
+    # delay in 1/100 s
+    data = b'GIF89a' + struct.pack('<HHBBB', SIZE[0], SIZE[1], 0xF2, 0, 0)
+    data += b''.join(bytes(color) for color in PALETTE)
+    data += b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00'
+    for box, pixels, disposal in frames:
+        left, top, right, bottom = box
+        data += struct.pack('<BBBBHBB', 0x21, 0xF9, 4, disposal << 2 | 1, delay, TRANSPARENT, 0)
+        data += struct.pack('<BHHHHB', 0x2C, left, top, right - left, bottom - top, 0)
+        data += encodeLZW(pixels)
+    with open(path, 'wb') as output:
+        output.write(data + b'\x3b')
+
+
+def getReferenceFrames(frames):
+    # GIF89a composition, the background being transparent (as in browsers)
+    canvas = [None] * (SIZE[0] * SIZE[1])
+    shown = []
+    for box, pixels, disposal in frames:
+        left, top, right, bottom = box
+        rectangle = [y * SIZE[0] + x for y in range(top, bottom) for x in range(left, right)]
+        saved = list(canvas)
+        for offset, index in zip(rectangle, pixels):
+            if index != TRANSPARENT:
+                canvas[offset] = PALETTE[index] + (255,)
+        shown.append(b''.join(bytes(pixel or (0, 0, 0, 0)) for pixel in canvas))
+        if disposal == 2:
+            for offset in rectangle:
+                canvas[offset] = None
+        elif disposal == 3:
+            canvas = saved
+    return shown
+
+
+def getFrames(disposal):
+    # A full first frame kept as background, then two smaller
+    # overlapping frames with transparent pixels and the disposal tested
+    width, height = SIZE
+    return [
+        ((0, 0, width, height), [1] * (width * height), 1),
+        ((1, 1, 4, 3), [2, 0, 2, 2, 0, 2], disposal),
+        ((3, 0, 6, 2), [3, 3, 0, 0, 3, 3], disposal),
+    ]
+
+
+@pytest.mark.parametrize('disposal', [1, 2, 3])
+def test_frames_match_reference(tmp_path, disposal):
+    path = tmp_path / 'disposal.gif'
+    frames = getFrames(disposal)
+    writeGIF(path, frames)
+    with Image.open(path) as img:
+        decoded = [(frame.tobytes(), delay) for frame, delay in iterFrames(img)]
+    assert [delay for _, delay in decoded] == [100] * len(frames)
+    assert [pixels for pixels, _ in decoded] == getReferenceFrames(frames)
+
+
+def test_disposals_differ():
+    # The frames above do exercise the disposal methods
+    references = [getReferenceFrames(getFrames(disposal))[-1] for disposal in (1, 2, 3)]
+    assert len(set(references)) == 3
+
+
+@pytest.mark.parametrize('delay, expected', [(0, 100), (1, 100), (2, 20)])
+def test_short_delays(tmp_path, delay, expected):
+    # Zero delays, even on every frame, play at the browsers' default
+    path = tmp_path / 'fast.gif'
+    frames = getFrames(1)
+    writeGIF(path, frames, delay)
+    with Image.open(path) as img:
+        assert [delay for _, delay in iterFrames(img)] == [expected] * len(frames)
@@ -0,0 +1,49 @@
+import pytest
+
+gi = pytest.importorskip('gi')
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GdkPixbuf  # noqa: E402
+from gi.repository import GLib  # noqa: E402
+
+from src import parallelscale  # noqa: E402
+from src.parallelscale import scaleParallel  # noqa: E402
+
+INTERPOLATIONS = [GdkPixbuf.InterpType.NEAREST, GdkPixbuf.InterpType.TILES,
+                  GdkPixbuf.InterpType.BILINEAR, GdkPixbuf.InterpType.HYPER]
+
+
+def makePixbuf(width, height, has_alpha):
+    # Sharp pattern: any shift at a band seam changes the output
+    channels = 4 if has_alpha else 3
+    data = bytearray(width * height * channels)
+    for offset in range(0, len(data), channels):
+        pixel = offset // channels
+        x, y = pixel % width, pixel // width
+        data[offset:offset + channels] = bytes(((x * 7) % 256, (y * 13) % 256, ((x ^ y) * 3) % 256, 255)[:channels])
+    return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(bytes(data)), GdkPixbuf.Colorspace.RGB,
+                                           has_alpha, 8, width, height, width * channels)
+
+
+def getRows(pixbuf):
+    # Pixels without the row padding
+    pixels = pixbuf.get_pixels()
+    row_bytes = pixbuf.get_width() * pixbuf.get_n_channels()
+    stride = pixbuf.get_rowstride()
+    return [pixels[y * stride:y * stride + row_bytes] for y in range(pixbuf.get_height())]
+
+
+@pytest.mark.parametrize('interp', INTERPOLATIONS)
+@pytest.mark.parametrize('has_alpha', [False, True])
+@pytest.mark.parametrize('size', [(301, 517), (1200, 1001)])
+def test_bands_match_scale_simple(monkeypatch, interp, has_alpha, size):
+    # Force the banded path on small images, with several bands
+    monkeypatch.setattr(parallelscale, 'PARALLEL_MIN_PIXELS', 0)
+    monkeypatch.setattr(parallelscale.os, 'cpu_count', lambda: 7)
+    source = makePixbuf(640, 480, has_alpha)
+    width, height = size
+    expected = getRows(source.scale_simple(width, height, interp))
+    rows = getRows(scaleParallel(source, width, height, interp))
+    assert len(rows) == len(expected)
+    for y, (row, expected_row) in enumerate(zip(rows, expected)):
+        # Equal up to rounding, a seam error is far bigger
+        assert max(abs(a - b) for a, b in zip(row, expected_row)) <= 1, 'row %d' % y
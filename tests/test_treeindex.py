@@ -0,0 +1,65 @@
+import os
+import random
+
+from src.sorting import getNaturalKey
+from src.treeindex import TreeIndex
+from src.treeindex import getFolderKey
+
+
+def getExpected(names):
+    def key(name):
+        folder, filename = os.path.split(name)
+        return getFolderKey(folder), getNaturalKey(filename)
+
+    return sorted(names, key=key)
+
+
+def checkIndex(tree, names):
+    assert len(tree) == len(names)
+    for position in range(len(tree)):
+        assert tree.getPosition(tree[position]) == position
+    if tree.shuffled:
+        assert sorted(tree[position] for position in range(len(tree))) == sorted(names)
+    else:
+        assert [tree[position] for position in range(len(tree))] == getExpected(names)
+
+
+def getListings(root):
+    return {
+        root: ['b.jpg', 'a10.jpg', 'a2.jpg'],
+        os.path.join(root, 'sub'): ['x.png'],
+        os.path.join(root, 'sub', 'deep'): ['1.jpg', '3.jpg'],
+        os.path.join(root, 'other'): ['z.gif', 'y.gif'],
+    }
+
+
+def test_sorted_order():
+    tree = TreeIndex('/root', getListings('/root'))
+    assert tree[0] == 'a2.jpg'
+    assert tree[-1] == os.path.join('sub', 'deep', '3.jpg')
+    assert tree.getPosition(os.path.join('other', 'y.gif')) == 3
+
+
+def test_random_changes():
+    random.seed(3)
+    for shuffled in (False, True):
+        tree = TreeIndex('/root', getListings('/root'))
+        names = set(tree[position] for position in range(len(tree)))
+        if shuffled:
+            tree.shuffle('b.jpg')
+            assert tree[0] == 'b.jpg'
+        folders = ['', 'sub', os.path.join('sub', 'deep'), 'other', 'new', os.path.join('new', 'sub')]
+        for step in range(300):
+            if names and random.random() < 0.4:
+                name = random.choice(sorted(names))
+                assert tree.remove(name)
+                names.discard(name)
+            else:
+                name = os.path.join(random.choice(folders), '%d.jpg' % random.randrange(50))
+                position = tree.insert(name)
+                assert tree[position] == name
+                names.add(name)
+            if step % 50 == 0:
+                checkIndex(tree, names)
+        checkIndex(tree, names)
+        assert not tree.update(['b.jpg'] if 'b.jpg' in names else [], ['missing.jpg'])